@@ -7,9 +7,14 @@ import io
 import webbrowser
 import threading
 import logging
+import time
+import itertools
+import signal
+import secrets
+import functools
 from datetime import datetime
 import pandas as pd
-from flask import Flask, jsonify, request, send_file, send_from_directory
+from flask import Flask, jsonify, request, send_file, send_from_directory, make_response
 from flask_cors import CORS
 
 # Add backend directory to path
@@ -46,25 +51,44 @@ from database import (
     init_db, add_server, get_all_servers, get_server,
     delete_server, update_server_scan_data, update_server_status,
     bulk_add_servers, get_server_stats, clear_all_servers, clear_all_data,
+    ScanResultBatcher,
     clear_servers_by_project, clear_unassigned_servers,
     # Project functions
     create_project, get_all_projects, get_project, delete_project,
     rename_project, get_servers_by_project, get_unassigned_servers,
-    assign_servers_to_project, get_all_projects_with_stats, get_server_stats_unassigned
+    assign_servers_to_project, get_all_projects_with_stats, get_server_stats_unassigned,
+    get_stats_by_project, check_project_stats, SCAN_COLUMNS, get_servers_page, search_servers,
+    get_server_hardware, find_servers_by_mac, get_hardware_totals_by_project,
+    get_server_history, get_server_state_at, snapshot_db, is_memory_db, get_data_version,
+    read_cache, get_host_alias_groups, get_servers_to_scan,
+    # Credential profiles
+    create_credential_profile, update_credential_profile, delete_credential_profile,
+    get_credential_profiles, get_credential_profile_secrets, assign_credential_profile,
+    consolidate_credentials,
+    # Discovery cache
+    mark_ips_dead, unmark_ips_dead, get_dead_intervals, clear_discovery_cache
 )
-from scanner import scan_server, scan_all_servers, detect_os_type, discover_servers_in_range
-from excel_export import generate_excel_report, generate_project_excel_report, generate_all_projects_excel_report
+from scanner import (
+    scan_server, iter_scan_servers, detect_os_type, detect_os_types,
+    iter_discovery, iter_probe, is_host_up
+)
+from excel_export import generate_excel_report, generate_project_excel_report, generate_all_projects_excel_report, EXPORT_COLUMNS
 from encryption import encrypt_password, decrypt_password, sanitize_server_data, rotate_encryption_key, get_key_info
+from iprange import build_intervals, iter_ips, count_ips, parse_range, subtract, ip_to_int
 from validation import validate_ip, validate_username, validate_password, validate_project_name, validate_os_type
 from audit import (
     audit_server_add, audit_server_delete, audit_server_clear,
     audit_password_access, audit_credential_update, audit_export,
     audit_scan_start, audit_scan_complete, audit_project_create,
-    audit_project_delete, audit_key_rotation
+    audit_project_delete, audit_key_rotation, audit_credential_profile
 )
 
 # Import configuration
-from config import get_frontend_path, SERVER_HOST, SERVER_PORT, USE_HTTPS
+from config import (
+    get_frontend_path, SERVER_HOST, SERVER_PORT, USE_HTTPS, MAX_RANGE_IPS, MAX_IMPORT_IPS,
+    DISCOVERY_BATCH_SIZE, DISCOVERY_FLUSH_SECS, DISCOVERY_NEGATIVE_TTL, OS_DETECT_WORKERS,
+    SCAN_SAVE_BATCH, SCAN_SAVE_INTERVAL, PAGE_SIZE_DEFAULT
+)
 
 # Get frontend path from config
 FRONTEND_DIR = get_frontend_path()
@@ -74,6 +98,29 @@ logging.info(f"Using frontend directory: {FRONTEND_DIR} (exists: {os.path.exists
 app = Flask(__name__, static_folder=FRONTEND_DIR, static_url_path='')
 CORS(app)
 
+# ETags are '<boot id>-<data version>': the boot id keeps a restarted (wiped or
+# in-memory) DB whose counter starts over from matching tags cached by the browser
+BOOT_ID = secrets.token_hex(4)
+
+
+def etagged(view):
+    # Conditional GET on inventory reads: 304 while servers/projects haven't changed
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        tag = f'{BOOT_ID}-{get_data_version()}'
+        if request.if_none_match.contains(tag):
+            resp = make_response('', 304)
+            resp.set_etag(tag)
+            return resp
+        resp = make_response(view(*args, **kwargs))
+        if resp.status_code == 200:
+            resp.set_etag(tag)
+            # Cache, but revalidate every time
+            resp.headers['Cache-Control'] = 'no-cache'
+        return resp
+    return wrapper
+
+
 # Initialize database
 try:
     logging.info("Initializing database...")
@@ -148,6 +195,126 @@ def api_save_credentials():
         return jsonify({'success': False, 'error': 'Internal server error'}), 500
 
 
+# Credential profiles - shared creds that servers reference by id
+
+@app.route('/api/credential-profiles', methods=['GET'])
+def api_get_credential_profiles():
+    try:
+        return jsonify({'success': True, 'profiles': get_credential_profiles()})
+    except Exception as e:
+        logging.error(f"API error: {e}", exc_info=True)
+        return jsonify({'success': False, 'error': 'Internal server error'}), 500
+
+
+@app.route('/api/credential-profiles', methods=['POST'])
+def api_create_credential_profile():
+    try:
+        data = request.get_json(silent=True) or {}
+        name = (data.get('name') or '').strip()
+        user = (data.get('username') or '').strip()
+        pwd = data.get('password') or ''
+        
+        if not name:
+            return jsonify({'success': False, 'error': 'Profile name is required'}), 400
+        for check, val in ((validate_username, user), (validate_password, pwd)):
+            is_valid, error_msg = check(val)
+            if not is_valid:
+                return jsonify({'success': False, 'error': error_msg}), 400
+        if not user or not pwd:
+            return jsonify({'success': False, 'error': 'Username and password are required'}), 400
+        
+        res = create_credential_profile(name, user, pwd)
+        audit_credential_profile('CREATE', res.get('id'), {'name': name}, request, success=res['success'])
+        if not res['success']:
+            return jsonify(res), 400
+        return jsonify(res)
+    except Exception as e:
+        logging.error(f"API error: {e}", exc_info=True)
+        return jsonify({'success': False, 'error': 'Internal server error'}), 500
+
+
+@app.route('/api/credential-profiles/<int:profile_id>', methods=['PUT'])
+def api_update_credential_profile(profile_id):
+    # Changing the password here re-points every server using the profile at once
+    try:
+        data = request.get_json(silent=True) or {}
+        name = data.get('name')
+        user = data.get('username')
+        pwd = data.get('password')
+        
+        if name is not None:
+            name = name.strip()
+            if not name:
+                return jsonify({'success': False, 'error': 'Profile name is required'}), 400
+        if user is not None:
+            user = user.strip()
+            is_valid, error_msg = validate_username(user)
+            if not is_valid or not user:
+                return jsonify({'success': False, 'error': error_msg or 'Username is required'}), 400
+        if pwd is not None:
+            is_valid, error_msg = validate_password(pwd)
+            if not is_valid or not pwd:
+                return jsonify({'success': False, 'error': error_msg or 'Password is required'}), 400
+        
+        res = update_credential_profile(profile_id, name, user, pwd)
+        audit_credential_profile('UPDATE', profile_id, {'password_changed': pwd is not None}, request, success=res['success'])
+        if not res['success']:
+            return jsonify(res), 404 if res['error'] == 'Credential profile not found' else 400
+        return jsonify(res)
+    except Exception as e:
+        logging.error(f"API error: {e}", exc_info=True)
+        return jsonify({'success': False, 'error': 'Internal server error'}), 500
+
+
+@app.route('/api/credential-profiles/<int:profile_id>', methods=['DELETE'])
+def api_delete_credential_profile(profile_id):
+    try:
+        ok = delete_credential_profile(profile_id)
+        audit_credential_profile('DELETE', profile_id, request=request, success=ok)
+        if not ok:
+            return jsonify({'success': False, 'error': 'Credential profile not found'}), 404
+        return jsonify({'success': True})
+    except Exception as e:
+        logging.error(f"API error: {e}", exc_info=True)
+        return jsonify({'success': False, 'error': 'Internal server error'}), 500
+
+
+@app.route('/api/credential-profiles/assign', methods=['POST'])
+def api_assign_credential_profile():
+    # Body: profile_id (null = unassign) + any of server_ids, project_id ('unassigned' ok), subnet
+    try:
+        data = request.get_json(silent=True) or {}
+        profile_id = data.get('profile_id')
+        try:
+            res = assign_credential_profile(
+                int(profile_id) if profile_id is not None else None,
+                server_ids=data.get('server_ids'),
+                project=data.get('project_id'),
+                subnet=(data.get('subnet') or '').strip() or None
+            )
+        except (ValueError, TypeError) as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        audit_credential_profile('ASSIGN', profile_id, {'updated': res.get('updated', 0)}, request, success=res['success'])
+        if not res['success']:
+            return jsonify(res), 404
+        return jsonify(res)
+    except Exception as e:
+        logging.error(f"API error: {e}", exc_info=True)
+        return jsonify({'success': False, 'error': 'Internal server error'}), 500
+
+
+@app.route('/api/credential-profiles/consolidate', methods=['POST'])
+def api_consolidate_credentials():
+    # Turn per-server secrets into shared profiles
+    try:
+        res = consolidate_credentials()
+        audit_credential_profile('CONSOLIDATE', details=res, request=request)
+        return jsonify({'success': True, **res})
+    except Exception as e:
+        logging.error(f"API error: {e}", exc_info=True)
+        return jsonify({'success': False, 'error': 'Internal server error'}), 500
+
+
 @app.route('/api/servers/<int:srv_id>/credentials', methods=['PUT'])
 def api_update_server_credentials(srv_id):
     try:
@@ -196,10 +363,28 @@ def api_update_server_credentials(srv_id):
 # Server API
 
 @app.route('/api/servers', methods=['GET'])
+@etagged
 def api_get_servers():
     try:
         project_id = request.args.get('project_id')
         
+        # Paged mode: filtering/sorting done in SQL, one page per request
+        if 'limit' in request.args or 'cursor' in request.args:
+            try:
+                page = get_servers_page(
+                    project=project_id or None,
+                    status=request.args.get('status') or None,
+                    os_type=request.args.get('os') or None,
+                    search=(request.args.get('q') or '').strip() or None,
+                    sort=request.args.get('sort', 'hostname'),
+                    direction=request.args.get('dir', 'asc'),
+                    limit=request.args.get('limit', PAGE_SIZE_DEFAULT, type=int),
+                    cursor=request.args.get('cursor') or None
+                )
+            except ValueError as e:
+                return jsonify({'success': False, 'error': str(e)}), 400
+            return jsonify({'success': True, **page})
+        
         if project_id is not None:
             if project_id == 'unassigned':
                 servers = get_unassigned_servers()
@@ -217,6 +402,36 @@ def api_get_servers():
         return jsonify({'success': False, 'error': 'Internal server error'}), 500
 
 
+@app.route('/api/servers/search', methods=['GET'])
+def api_search_servers():
+    # Ranked full-text search over hostname, model, serial, CPU, OS, disks, NICs...
+    try:
+        q = (request.args.get('q') or '').strip()
+        if not q:
+            return jsonify({'success': False, 'error': 'Missing search text (q)'}), 400
+        try:
+            res = search_servers(
+                q,
+                limit=request.args.get('limit', 50, type=int),
+                project=request.args.get('project_id') or None
+            )
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        return jsonify({'success': True, 'query': q, **res})
+    except Exception as e:
+        logging.error(f"API error: {e}", exc_info=True)
+        return jsonify({'success': False, 'error': 'Internal server error'}), 500
+
+
+@app.route('/api/servers/by-mac/<mac>', methods=['GET'])
+def api_servers_by_mac(mac):
+    try:
+        return jsonify({'success': True, 'servers': find_servers_by_mac(mac)})
+    except Exception as e:
+        logging.error(f"API error: {e}", exc_info=True)
+        return jsonify({'success': False, 'error': 'Internal server error'}), 500
+
+
 @app.route('/api/servers/<int:srv_id>', methods=['GET'])
 def api_get_server(srv_id):
     try:
@@ -226,6 +441,7 @@ def api_get_server(srv_id):
             if srv.get('password'):
                 audit_password_access(srv_id, srv.get('ip'), request)
             srv = sanitize_server_data(srv)
+            srv.update(get_server_hardware(srv_id))
             return jsonify({'success': True, 'server': srv})
         return jsonify({'success': False, 'error': 'Server not found'}), 404
     except Exception as e:
@@ -233,6 +449,28 @@ def api_get_server(srv_id):
         return jsonify({'success': False, 'error': 'Internal server error'}), 500
 
 
+@app.route('/api/servers/<int:srv_id>/history', methods=['GET'])
+def api_server_history(srv_id):
+    # Change log of a server; ?at=<ISO time> instead returns its state at that moment
+    try:
+        at = request.args.get('at')
+        if at:
+            try:
+                at = to_local_iso(at)
+            except ValueError:
+                return jsonify({'success': False, 'error': 'Invalid time, use ISO format (2024-05-01T12:00)'}), 400
+            snap = get_server_state_at(srv_id, at)
+            if snap is None:
+                return jsonify({'success': False, 'error': 'No history for this server at that time'}), 404
+            return jsonify({'success': True, **snap})
+        
+        limit = request.args.get('limit', 200, type=int)
+        return jsonify({'success': True, 'history': get_server_history(srv_id, limit)})
+    except Exception as e:
+        logging.error(f"API error: {e}", exc_info=True)
+        return jsonify({'success': False, 'error': 'Internal server error'}), 500
+
+
 @app.route('/api/servers', methods=['POST'])
 def api_add_server():
     try:
@@ -366,7 +604,10 @@ def api_bulk_import():
                 # Check if it's IP ranges or regular IPs
                 use_ip_range = data.get('is_ip_range', False)
                 if use_ip_range:
-                    srv_list = parse_ip_ranges(data['content'])
+                    try:
+                        srv_list = parse_ip_ranges(data['content'])
+                    except ValueError as e:
+                        return jsonify({'success': False, 'error': str(e)}), 400
                 else:
                     srv_list = parse_server_list_content(data['content'])
                 res = bulk_add_servers(srv_list, proj_id)
@@ -430,70 +671,92 @@ def api_add_ip_ranges():
             except (ValueError, TypeError):
                 return jsonify({'success': False, 'error': 'Invalid project_id'}), 400
         
-        # Expand all IP ranges
-        all_ips = []
+        # Collect ranges as integer intervals - nothing is expanded yet
+        specs = []
         for range_obj in ip_ranges:
             if not isinstance(range_obj, dict):
                 continue
             
-            start_ip = range_obj.get('start', '').strip()
-            end_ip = range_obj.get('end', '').strip()
-            
-            if not start_ip or not end_ip:
-                continue
+            cidr = (range_obj.get('cidr') or '').strip()
+            start_ip = (range_obj.get('start') or '').strip()
+            end_ip = (range_obj.get('end') or '').strip()
             
-            # Expand this range
-            ips = expand_ip_range_from_to(start_ip, end_ip)
-            all_ips.extend(ips)
+            if cidr:
+                specs.append(cidr)
+            elif start_ip and end_ip:
+                specs.append((start_ip, end_ip))
+            elif start_ip:
+                # CIDR or short range typed into the start field
+                specs.append(start_ip)
+        
+        exclude = data.get('exclude') or []
+        if isinstance(exclude, str):
+            exclude = [e for e in exclude.replace(',', '\n').split('\n') if e.strip()]
+        
+        try:
+            intervals = build_intervals(specs, exclude)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': f'Invalid IP range: {e}'}), 400
         
-        if not all_ips:
+        total_ips = count_ips(intervals)
+        if not total_ips:
             return jsonify({'success': False, 'error': 'No valid IPs found in ranges'}), 400
+        if total_ips > MAX_RANGE_IPS:
+            return jsonify({'success': False, 'error': f'Too many IPs in ranges ({total_ips}), max is {MAX_RANGE_IPS}'}), 400
+        if not discovery_mode and total_ips > MAX_IMPORT_IPS:
+            # Every IP would become a server row - only discovery streams ranges this big
+            return jsonify({'success': False, 'error': f'Too many IPs to import ({total_ips}), max is {MAX_IMPORT_IPS} - use discovery mode for bigger ranges'}), 400
         
-        logging.info(f"IP Range request: {len(all_ips)} IPs, discovery_mode={discovery_mode}")
+        all_ips = iter_ips(intervals)
+        logging.info(f"IP Range request: {total_ips} IPs, discovery_mode={discovery_mode}")
         
-        # Discovery Mode: Scan for active servers only
+        # Discovery Mode: Scan for active servers only, hits go to the DB in batches
         if discovery_mode:
-            logging.info(f"Starting discovery scan for {len(all_ips)} IPs...")
-            active_servers = discover_servers_in_range(all_ips, max_workers=50)
-            logging.info(f"Discovery complete: Found {len(active_servers)} active servers")
+            if not claim_discovery(total_ips):
+                return jsonify({'success': False, 'error': 'A discovery sweep is already running'}), 409
             
-            # Create server list from discovered servers
-            srv_list = []
-            for srv_info in active_servers:
-                srv_list.append({
-                    'ip': srv_info['ip'],
-                    'username': '',
-                    'password': '',
-                    'os_type': srv_info['os_type']
-                })
+            try:
+                # Negative cache: 'skip' known-dead IPs, 'defer' them to the end, or 'off' for a full sweep
+                neg_mode = data.get('negative_cache', 'skip')
+                if data.get('force_full'):
+                    neg_mode = 'off'
+                cached_dead = 0
+                if neg_mode in ('skip', 'defer'):
+                    dead = get_dead_intervals(intervals, DISCOVERY_NEGATIVE_TTL)
+                    cached_dead = count_ips(dead)
+                    live = subtract(intervals, dead)
+                    if neg_mode == 'skip':
+                        all_ips, total_ips = iter_ips(live), count_ips(live)
+                    else:
+                        all_ips = itertools.chain(iter_ips(live), iter_ips(dead))
+            except Exception:
+                # run_discovery never got the slot, so give it back here
+                release_discovery()
+                raise
+            
+            logging.info(f"Starting discovery scan for {total_ips} IPs ({cached_dead} cached dead, mode={neg_mode})...")
+            res = run_discovery(all_ips, total_ips, proj_id)
+            res['cached_dead'] = cached_dead
+            res['skipped_dead'] = cached_dead if neg_mode == 'skip' else 0
+            logging.info(f"Discovery complete: Found {res['found']} active servers")
             
-            if not srv_list:
+            if not res['found']:
                 return jsonify({
                     'success': True, 
                     'result': {'added': 0, 'skipped': 0, 'failed': 0},
-                    'message': f'No active servers found in {len(all_ips)} IPs scanned',
-                    'scanned': len(all_ips)
+                    'message': f'No active servers found in {total_ips} IPs scanned',
+                    'scanned': total_ips,
+                    'skipped_dead': res['skipped_dead'],
+                    'probe_errors': res['probe_errors']
                 })
+            return jsonify({'success': True, 'result': res})
         else:
             # Normal Mode: Add all IPs
-            srv_list = []
-            for ip in all_ips:
-                os_t = detect_os_type(ip) if auto_detect else 'Windows'
-                srv_list.append({
-                    'ip': ip,
-                    'username': '',
-                    'password': '',
-                    'os_type': os_t
-                })
+            srv_list = build_import_list(all_ips, auto_detect)
         
         # Add servers
         res = bulk_add_servers(srv_list, proj_id)
         
-        # Add discovery info if applicable
-        if discovery_mode:
-            res['scanned'] = len(all_ips)
-            res['found'] = len(srv_list)
-        
         return jsonify({'success': True, 'result': res})
         
     except Exception as e:
@@ -501,64 +764,87 @@ def api_add_ip_ranges():
         return jsonify({'success': False, 'error': 'Internal server error'}), 500
 
 
-def expand_ip_range_from_to(start_ip, end_ip):
-    """
-    Expand IP range from start_ip to end_ip
-    Returns: list of IP addresses
-    """
+# Progress of the running discovery sweep (polled by the UI)
+discovery_progress = {'running': False, 'probed': 0, 'total': 0, 'found': 0, 'added': 0}
+discovery_lock = threading.Lock()
+
+
+def claim_discovery(total):
+    # Check-and-set of the running flag in one step - only one sweep at a time
+    with discovery_lock:
+        if discovery_progress['running']:
+            return False
+        discovery_progress.update(running=True, probed=0, total=total, found=0, added=0)
+        return True
+
+
+def release_discovery():
+    with discovery_lock:
+        discovery_progress['running'] = False
+
+
+def run_discovery(ips, total, proj_id=None):
+    # Probe IPs and insert hits in small batches as they come in,
+    # so partial results show up in the UI and nothing big is held in memory.
+    # Caller must hold the slot from claim_discovery(); it's released when this returns
+    res = {'success': 0, 'failed': 0, 'errors': [], 'scanned': 0, 'found': 0, 'probe_errors': 0}
+    batch = []
+    dead, alive = [], []
+    last_flush = time.monotonic()
+    
+    def flush():
+        if batch:
+            r = bulk_add_servers(batch, proj_id)
+            res['success'] += r['success']
+            res['failed'] += r['failed']
+            res['errors'].extend(r['errors'])
+            discovery_progress['added'] = res['success']
+            batch.clear()
+        # Keep the negative cache in step with what we just saw
+        mark_ips_dead(dead)
+        unmark_ips_dead(alive)
+        dead.clear()
+        alive.clear()
+    
+    discovery_progress['total'] = total
     try:
-        start_ip = start_ip.strip()
-        end_ip = end_ip.strip()
-        
-        # Parse start IP
-        start_parts = start_ip.split('.')
-        if len(start_parts) != 4:
-            return []
-        
-        # Parse end IP
-        end_parts = end_ip.split('.')
-        if len(end_parts) != 4:
-            return []
-        
-        # Convert to integers
-        start_octets = [int(p) for p in start_parts]
-        end_octets = [int(p) for p in end_parts]
-        
-        # Generate IPs
-        ips = []
-        # For simplicity, only support last octet range
-        if start_parts[0:3] == end_parts[0:3]:
-            # Same network, only last octet changes
-            base = f"{start_parts[0]}.{start_parts[1]}.{start_parts[2]}"
-            for i in range(start_octets[3], end_octets[3] + 1):
-                ips.append(f"{base}.{i}")
-        else:
-            # Full range - this gets complex, we'll support it later if needed
-            logging.warning(f"Complex IP range not fully supported yet: {start_ip} - {end_ip}")
-            return []
-        
-        return ips
-    except Exception as e:
-        logging.error(f"Error expanding IP range '{start_ip}' to '{end_ip}': {e}")
-        return []
+        for hit in iter_discovery(ips, max_workers=50):
+            res['scanned'] += 1
+            discovery_progress['probed'] = res['scanned']
+            if hit['reachable']:
+                res['found'] += 1
+                discovery_progress['found'] = res['found']
+                batch.append({'ip': hit['ip'], 'username': '', 'password': '', 'os_type': hit['os_type']})
+                alive.append(ip_to_int(hit['ip']))
+            elif hit.get('error'):
+                # Local failure, not a dead host - keep it out of the negative cache
+                res['probe_errors'] += 1
+            else:
+                dead.append(ip_to_int(hit['ip']))
+            
+            if len(batch) >= DISCOVERY_BATCH_SIZE or len(dead) >= 1000 or time.monotonic() - last_flush >= DISCOVERY_FLUSH_SECS:
+                flush()
+                last_flush = time.monotonic()
+        flush()
+    finally:
+        release_discovery()
+    
+    return res
 
 
-def expand_ip_range(range_str):
-    """
-    Expand IP range like '192.168.1.1-192.168.1.255' to list of IPs
-    Returns: list of IP addresses
-    """
+@app.route('/api/servers/ip-ranges/progress', methods=['GET'])
+def api_discovery_progress():
+    return jsonify({'success': True, 'progress': dict(discovery_progress)})
+
+
+@app.route('/api/discovery/cache', methods=['DELETE'])
+def api_clear_discovery_cache():
     try:
-        # Format: 192.168.1.1-192.168.1.255
-        if '-' not in range_str:
-            # Single IP
-            return [range_str.strip()]
-        
-        start_ip, end_ip = range_str.split('-')
-        return expand_ip_range_from_to(start_ip, end_ip)
+        cnt = clear_discovery_cache()
+        return jsonify({'success': True, 'deleted': cnt})
     except Exception as e:
-        logging.error(f"Error expanding IP range '{range_str}': {e}")
-        return []
+        logging.error(f"API error: {e}", exc_info=True)
+        return jsonify({'success': False, 'error': 'Internal server error'}), 500
 
 
 def parse_ip_ranges(content, auto_detect=True):
@@ -566,37 +852,61 @@ def parse_ip_ranges(content, auto_detect=True):
     Parse IP ranges from text content
     Format examples:
         192.168.1.1-192.168.1.255
-        10.0.0.1-10.0.0.50
+        10.0.0.0/24
+        10.0.0.1-50
+        !10.0.0.7          (exclude)
         # comment
         172.16.5.100
     """
-    srv_list = []
-    lines = content.strip().split('\n')
-    
-    for line in lines:
+    specs = []
+    excl = []
+    for line in content.strip().split('\n'):
         line = line.strip()
         if not line or line.startswith('#'):
             continue
-        
-        # Check if it's a range
-        if '-' in line:
-            # IP range
-            ips = expand_ip_range(line)
-            for ip in ips:
-                os_t = detect_os_type(ip) if auto_detect else 'Windows'
-                srv_list.append({'ip': ip, 'username': '', 'password': '', 'os_type': os_t})
+        if line.startswith('!'):
+            excl.append(line[1:].strip())
         else:
-            # Single IP
-            ip_addr = line.strip()
-            os_t = detect_os_type(ip_addr) if auto_detect else 'Windows'
-            srv_list.append({'ip': ip_addr, 'username': '', 'password': '', 'os_type': os_t})
+            specs.append(line)
     
-    return srv_list
+    # Bad lines are logged and skipped, same as before
+    good = []
+    for spec in specs:
+        try:
+            parse_range(spec)
+            good.append(spec)
+        except ValueError as e:
+            logging.error(f"Error expanding IP range '{spec}': {e}")
+    try:
+        intervals = build_intervals(good, excl)
+    except ValueError as e:
+        logging.error(f"Bad exclude in IP range list: {e}")
+        intervals = build_intervals(good)
+    
+    total = count_ips(intervals)
+    if total > MAX_IMPORT_IPS:
+        raise ValueError(f'Too many IPs to import ({total}), max is {MAX_IMPORT_IPS} - use discovery mode for bigger ranges')
+    return build_import_list(iter_ips(intervals), auto_detect)
+
+
+def build_import_list(ips, auto_detect=True, hints=None):
+    # Server dicts for bulk import; OS detection for all IPs without a hint runs as one parallel batch
+    ips = list(ips)
+    hints = hints or {}
+    detected = {}
+    if auto_detect:
+        todo = list(dict.fromkeys(ip for ip in ips if not hints.get(ip)))
+        if todo:
+            detected = detect_os_types(todo, max_workers=OS_DETECT_WORKERS)
+    
+    return [{'ip': ip, 'username': '', 'password': '',
+             'os_type': hints.get(ip) or detected.get(ip) or 'Windows'} for ip in ips]
 
 
 def parse_server_list_content(content, auto_detect=True):
     # Parse IP list from text
-    srv_list = []
+    ips = []
+    hints = {}
     lines = content.strip().split('\n')
     
     for line in lines:
@@ -615,15 +925,11 @@ def parse_server_list_content(content, auto_detect=True):
             elif hint in ['W', 'WINDOWS']:
                 os_t = 'Windows'
         
-        if os_t is None:
-            if auto_detect:
-                os_t = detect_os_type(ip_addr)
-            else:
-                os_t = 'Windows'
-        
-        srv_list.append({'ip': ip_addr, 'username': '', 'password': '', 'os_type': os_t})
+        ips.append(ip_addr)
+        if os_t:
+            hints[ip_addr] = os_t
     
-    return srv_list
+    return build_import_list(ips, auto_detect, hints)
 
 
 # Project API
@@ -638,6 +944,7 @@ def api_get_projects():
         return jsonify({'success': False, 'error': 'Internal server error'}), 500
 
 @app.route('/api/projects/with-stats', methods=['GET'])
+@etagged
 def api_get_projects_with_stats():
     try:
         data = get_all_projects_with_stats()
@@ -757,20 +1064,33 @@ def api_assign_servers():
 
 # Scanning API
 
-def get_server_with_credentials(srv):
-    # Fill in default creds if server doesn't have them
+def load_scan_credentials(profile_ids=None):
+    # Decrypt profiles and OS defaults once for a whole scan batch
+    # {('profile', id) or ('default', 'windows'/'linux'): (username, password)}
+    creds = {('profile', pid): pair for pid, pair in get_credential_profile_secrets(profile_ids).items()}
+    for key, dflt in default_credentials.items():
+        enc_pwd = dflt.get('password_encrypted', '')
+        if dflt['username'] and enc_pwd:
+            creds[('default', key)] = (dflt['username'], decrypt_password(enc_pwd))
+    return creds
+
+
+def get_server_with_credentials(srv, creds=None):
+    # Own creds first, then the server's credential profile, then the OS default
     srv_copy = dict(srv)
-    os_t = srv_copy.get('os_type', 'Windows').lower()
+    if srv_copy.get('username') and srv_copy.get('password'):
+        return srv_copy
     
-    if not srv_copy.get('username') or not srv_copy.get('password'):
-        key = 'windows' if os_t == 'windows' else 'linux'
-        enc_pwd = default_credentials[key].get('password_encrypted', '')
-        if default_credentials[key]['username'] and enc_pwd:
-            srv_copy['username'] = default_credentials[key]['username']
-            srv_copy['password'] = decrypt_password(enc_pwd)
-        else:
-            return None
+    if creds is None:
+        pid = srv_copy.get('credential_profile_id')
+        creds = load_scan_credentials([pid] if pid else [])
+    os_t = (srv_copy.get('os_type') or 'Windows').lower()
+    key = 'windows' if os_t == 'windows' else 'linux'
+    pair = creds.get(('profile', srv_copy.get('credential_profile_id'))) or creds.get(('default', key))
+    if not pair or not pair[0] or not pair[1]:
+        return None
     
+    srv_copy['username'], srv_copy['password'] = pair
     return srv_copy
 
 @app.route('/api/scan/<int:srv_id>', methods=['POST'])
@@ -797,17 +1117,96 @@ def api_scan_server(srv_id):
         return jsonify({'success': False, 'error': 'Internal server error'}), 500
 
 
+def to_local_iso(text):
+    # DB timestamps are naive local time compared as strings - convert any UTC offset first.
+    # Raises ValueError if text isn't an ISO time
+    ts = datetime.fromisoformat(text)
+    if ts.tzinfo is not None:
+        ts = ts.astimezone().replace(tzinfo=None)
+    return ts.isoformat()
+
+
+SCAN_STATUSES = ('Online', 'Offline', 'Not Scanned')
+AGE_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_scan_policy(args, body):
+    # Rescan policies from query string or JSON body - ValueError on bad values
+    def param(name):
+        val = args.get(name, body.get(name))
+        return str(val).strip() if val not in (None, '') else None
+
+    max_age = param('max_age')
+    if max_age is not None:
+        unit = AGE_UNITS.get(max_age[-1].lower())
+        num = max_age[:-1] if unit else max_age
+        try:
+            max_age = float(num) * (unit or 1)
+        except ValueError:
+            raise ValueError(f'Invalid max_age: {max_age}')
+        if max_age < 0:
+            raise ValueError('max_age must not be negative')
+
+    only_status = param('only_status')
+    if only_status is not None:
+        only_status = [st.strip() for st in only_status.split(',') if st.strip()]
+        bad = [st for st in only_status if st not in SCAN_STATUSES]
+        if bad:
+            raise ValueError(f'Invalid only_status: {bad}')
+
+    changed_since = param('changed_since')
+    if changed_since is not None:
+        try:
+            changed_since = to_local_iso(changed_since)
+        except ValueError:
+            raise ValueError(f'Invalid changed_since: {changed_since}')
+
+    return {'max_age': max_age, 'only_status': only_status, 'changed_since': changed_since}
+
+
+def collapse_aliases(to_scan):
+    # One server per physical box (best-first of its alias group) -> (to scan, {primary id: [aliases]})
+    by_id = {s['id']: s for s in to_scan}
+    aliases = {}
+    for group in get_host_alias_groups(list(by_id)):
+        members = [by_id[m['id']] for m in group['servers'] if m['id'] in by_id]
+        if len(members) > 1:
+            aliases[members[0]['id']] = members[1:]
+    skip = {a['id'] for group in aliases.values() for a in group}
+    return [s for s in to_scan if s['id'] not in skip], aliases
+
+
+@app.route('/api/servers/aliases', methods=['GET'])
+def api_server_aliases():
+    # Servers that look like the same physical host (shared serial / MAC / hostname)
+    try:
+        project_id = request.args.get('project_id')
+        ids = None
+        if project_id == 'unassigned':
+            ids = [s['id'] for s in get_unassigned_servers(['id'])]
+        elif project_id:
+            ids = [s['id'] for s in get_servers_by_project(int(project_id), ['id'])]
+        groups = get_host_alias_groups(ids)
+        return jsonify({
+            'success': True,
+            'groups': groups,
+            'aliases': sum(len(g['servers']) - 1 for g in groups)
+        })
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Invalid project_id'}), 400
+    except Exception as e:
+        logging.error(f"API error: {e}", exc_info=True)
+        return jsonify({'success': False, 'error': 'Internal server error'}), 500
+
+
 @app.route('/api/scan-all', methods=['POST'])
 def api_scan_all():
     try:
         # Get project filter from query or body
-        proj_id = request.args.get('project_id')
-        if not proj_id:
-            try:
-                data = request.get_json(silent=True)
-                proj_id = data.get('project_id') if data else None
-            except:
-                proj_id = None
+        body = request.get_json(silent=True) or {}
+        proj_id = request.args.get('project_id') or body.get('project_id')
+        # Multi-homed hosts are scanned once per box unless dedupe is turned off
+        dedupe = str(request.args.get('dedupe', body.get('dedupe', True))).lower() not in ('0', 'false', 'no')
         
         if proj_id == 'unassigned':
             proj_id = 'unassigned'
@@ -817,31 +1216,39 @@ def api_scan_all():
             except (ValueError, TypeError):
                 proj_id = None
         
-        # Get servers to scan
-        if proj_id is not None:
-            if proj_id == 'unassigned':
-                servers = get_unassigned_servers()
-            else:
-                servers = get_servers_by_project(int(proj_id))
-        else:
-            servers = get_all_servers()
+        try:
+            policy = parse_scan_policy(request.args, body)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
+        # Get servers to scan - staleness policies are applied in SQL
+        # Only the scan path needs (decrypted) credentials
+        servers, skipped_fresh = get_servers_to_scan(proj_id, columns=SCAN_COLUMNS,
+                                                     with_credentials=True, **policy)
         
         if not servers:
-            return jsonify({'success': True, 'results': [], 'message': 'No servers to scan'})
+            return jsonify({'success': True, 'results': [], 'message': 'No servers to scan',
+                            'skipped_fresh': skipped_fresh})
         
         # Get servers ready for scanning
         to_scan = []
         skipped = 0
         
+        creds = load_scan_credentials()
         for srv in servers:
-            srv_with_creds = get_server_with_credentials(srv)
+            srv_with_creds = get_server_with_credentials(srv, creds)
             if srv_with_creds:
                 to_scan.append(srv_with_creds)
             else:
                 skipped += 1
         
         if not to_scan:
-            return jsonify({'success': True, 'results': [], 'message': 'No servers to scan (missing credentials)', 'skipped': skipped})
+            return jsonify({'success': True, 'results': [], 'message': 'No servers to scan (missing credentials)',
+                            'skipped': skipped, 'skipped_fresh': skipped_fresh})
+        
+        aliases = {}
+        if dedupe:
+            to_scan, aliases = collapse_aliases(to_scan)
         
         # Adjust workers based on count
         cnt = len(to_scan)
@@ -854,16 +1261,35 @@ def api_scan_all():
         else:
             workers = 50
         
-        results = scan_all_servers(to_scan, max_workers=workers)
-        
-        # Save results to DB
-        for res in results:
-            srv_id = res.get('id')
-            if srv_id:
+        # Results are written in micro-batches while the scan is still running
+        results = []
+        confirm = []
+        retry = []
+        collapsed = 0
+        with ScanResultBatcher(size=SCAN_SAVE_BATCH, interval=SCAN_SAVE_INTERVAL) as batcher:
+            for res in iter_scan_servers(to_scan, max_workers=workers):
+                results.append(res)
+                batcher.add(res)
+                # Same box answered: its other addresses only need a port check;
+                # if it didn't answer, try the other addresses themselves
                 if res.get('status') == 'Online':
-                    update_server_scan_data(srv_id, res)
+                    confirm += [(alias, res['id']) for alias in aliases.get(res.get('id'), [])]
                 else:
-                    update_server_status(srv_id, 'Offline')
+                    retry += aliases.get(res.get('id'), [])
+            
+            # Status / last_scan only for confirmed aliases - their own inventory stays
+            check = lambda item: is_host_up(item[0]['ip'], item[0].get('os_type'))
+            for (alias, primary), alive in iter_probe(check, confirm, max_workers=workers):
+                if alive is True:
+                    up = {'id': alias['id'], 'ip': alias['ip'], 'status': 'Online', 'alias_of': primary}
+                    results.append(up)
+                    batcher.add(up)
+                    collapsed += 1
+                else:
+                    retry.append(alias)
+            for res in iter_scan_servers(retry, max_workers=workers):
+                results.append(res)
+                batcher.add(res)
         
         return jsonify({
             'success': True,
@@ -871,7 +1297,9 @@ def api_scan_all():
             'total': len(results),
             'online': sum(1 for r in results if r.get('status') == 'Online'),
             'offline': sum(1 for r in results if r.get('status') == 'Offline'),
-            'skipped': skipped
+            'skipped': skipped,
+            'skipped_fresh': skipped_fresh,
+            'aliases_collapsed': collapsed
         })
         
     except Exception as e:
@@ -884,7 +1312,7 @@ def api_scan_all():
 @app.route('/api/export/excel', methods=['GET'])
 def api_export_excel():
     try:
-        srv_list = get_all_servers()
+        srv_list = get_all_servers(EXPORT_COLUMNS)
         stats = get_server_stats()
         filepath = generate_excel_report(srv_list, stats)
         audit_export(os.path.basename(filepath), None, request, success=True)
@@ -902,7 +1330,7 @@ def api_export_project_excel(proj_id):
         proj = get_project(proj_id)
         if not proj:
             return jsonify({'success': False, 'error': 'Project not found'}), 404
-        srv_list = get_servers_by_project(proj_id)
+        srv_list = get_servers_by_project(proj_id, EXPORT_COLUMNS)
         stats = get_server_stats(proj_id)
         filepath = generate_project_excel_report(proj['name'], srv_list, stats)
         audit_export(os.path.basename(filepath), proj_id, request, success=True)
@@ -917,13 +1345,14 @@ def api_export_project_excel(proj_id):
 def api_export_all_projects_excel():
     try:
         projs = get_all_projects()
+        all_stats = get_stats_by_project()
+        empty = {'total': 0, 'online': 0, 'offline': 0, 'not_scanned': 0, 'last_scan': None}
         proj_data = []
         for p in projs:
-            srv_list = get_servers_by_project(p['id'])
-            stats = get_server_stats(p['id'])
-            proj_data.append({'name': p['name'], 'servers': srv_list, 'stats': stats})
-        unassigned_srv = get_unassigned_servers()
-        unassigned_stats = get_server_stats_unassigned()
+            srv_list = get_servers_by_project(p['id'], EXPORT_COLUMNS)
+            proj_data.append({'name': p['name'], 'servers': srv_list, 'stats': all_stats.get(p['id'], empty)})
+        unassigned_srv = get_unassigned_servers(EXPORT_COLUMNS)
+        unassigned_stats = all_stats.get(None, empty)
         filepath = generate_all_projects_excel_report(proj_data, unassigned_srv, unassigned_stats)
         audit_export(os.path.basename(filepath), None, request, success=True)
         return send_file(filepath, as_attachment=True, download_name=os.path.basename(filepath),
@@ -1221,6 +1650,7 @@ def api_download_compare_report():
 
 
 @app.route('/api/stats', methods=['GET'])
+@etagged
 def api_get_stats():
     try:
         stats = get_server_stats()
@@ -1230,6 +1660,52 @@ def api_get_stats():
         return jsonify({'success': False, 'error': 'Internal server error'}), 500
 
 
+@app.route('/api/stats/verify', methods=['GET', 'POST'])
+def api_verify_stats():
+    # Recount project_stats from servers and compare; GET only checks, POST also rebuilds on mismatch
+    try:
+        res = check_project_stats(repair=request.method == 'POST')
+        if not res['consistent']:
+            logging.warning(f"project_stats out of sync: {len(res['mismatches'])} mismatches, repaired={res['repaired']}")
+        return jsonify({'success': True, **res})
+    except Exception as e:
+        logging.error(f"API error: {e}", exc_info=True)
+        return jsonify({'success': False, 'error': 'Internal server error'}), 500
+
+
+@app.route('/api/stats/hardware', methods=['GET'])
+def api_hardware_stats():
+    # Disk and RAM capacity per project from the normalized hardware tables
+    try:
+        totals = get_hardware_totals_by_project()
+        projects = [{'project_id': pid, **t} for pid, t in totals.items()]
+        return jsonify({'success': True, 'projects': projects})
+    except Exception as e:
+        logging.error(f"API error: {e}", exc_info=True)
+        return jsonify({'success': False, 'error': 'Internal server error'}), 500
+
+
+@app.route('/api/cache/stats', methods=['GET'])
+def api_cache_stats():
+    # Read cache hit rate / size
+    try:
+        return jsonify({'success': True, 'cache': read_cache.stats()})
+    except Exception as e:
+        logging.error(f"API error: {e}", exc_info=True)
+        return jsonify({'success': False, 'error': 'Internal server error'}), 500
+
+
+@app.route('/api/db/snapshot', methods=['POST'])
+def api_db_snapshot():
+    # Save the live DB to the snapshot file (the in-memory store's way of saving a session)
+    try:
+        res = snapshot_db()
+        return jsonify({'success': True, 'in_memory': is_memory_db(), **res})
+    except Exception as e:
+        logging.error(f"API error: {e}", exc_info=True)
+        return jsonify({'success': False, 'error': 'Internal server error'}), 500
+
+
 # ==================== KEY ROTATION API ====================
 
 @app.route('/api/security/key/info', methods=['GET'])
@@ -1300,6 +1776,9 @@ if __name__ == '__main__':
     if not os.environ.get('ELECTRON_RUN'):
         threading.Timer(1.5, open_browser).start()
     
+    # Turn SIGTERM into a normal exit so atexit hooks (in-memory DB snapshot) run
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    
     try:
         if USE_HTTPS:
             app.run(host=SERVER_HOST, port=SERVER_PORT, debug=False, ssl_context='adhoc')
@@ -241,3 +241,15 @@ def audit_project_delete(project_id, project_name=None, request=None, success=Tr
 
 
 
+
+
+def audit_credential_profile(action, profile_id=None, details=None, request=None, success=True):
+    """Audit credential profile change (CREATE / UPDATE / DELETE / ASSIGN / CONSOLIDATE)"""
+    client_ip = get_client_ip(request) if request else None
+    audit_log(
+        event_type='DATA_MODIFY',
+        action=f'{action}_CREDENTIAL_PROFILE',
+        details={'profile_id': profile_id, **(details or {})},
+        ip_address=client_ip,
+        success=success
+    )
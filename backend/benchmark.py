@@ -0,0 +1,140 @@
+# Benchmark runner for DB / API / export paths on synthetic fleets
+# Usage: python benchmark.py --sizes 1000,10000,100000 [--no-excel]
+
+import os
+import sys
+import time
+import argparse
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+def measure(fn):
+    # Run fn once, return (seconds, peak python memory above baseline in MB, result)
+    tracemalloc.reset_peak()
+    base = tracemalloc.get_traced_memory()[0]
+    t0 = time.perf_counter()
+    res = fn()
+    elapsed = time.perf_counter() - t0
+    peak = (tracemalloc.get_traced_memory()[1] - base) / (1024 * 1024)
+    return elapsed, peak, res
+
+
+def _get(client, url):
+    # Hit an endpoint through the flask test client, returns body size
+    def run():
+        r = client.get(url)
+        body = r.get_data()
+        r.close()
+        if r.status_code != 200:
+            raise RuntimeError(f'{url} -> {r.status_code}')
+        return len(body)
+    return run
+
+
+def _cleanup_exports(before):
+    from excel_export import EXPORT_PATH
+    if not os.path.isdir(EXPORT_PATH):
+        return
+    for f in os.listdir(EXPORT_PATH):
+        if f not in before:
+            try:
+                os.remove(os.path.join(EXPORT_PATH, f))
+            except OSError:
+                pass
+
+
+def run_size(size, projects, excel=True, repeat=1):
+    import database
+    from fleet_gen import generate_fleet
+    from app import app
+    from excel_export import EXPORT_PATH
+
+    database.clear_all_data()
+    t0 = time.perf_counter()
+    generate_fleet(size, num_projects=projects)
+    gen_time = time.perf_counter() - t0
+
+    # Triggers must have kept up with the bulk insert
+    chk = database.check_project_stats()
+    if not chk['consistent']:
+        raise RuntimeError(f"project_stats inconsistent after generate: {chk['mismatches'][:3]}")
+
+    client = app.test_client()
+    first_proj = database.get_all_projects()[0]['id'] if projects else None
+
+    cases = [
+        ('get_all_servers', database.get_all_servers),
+        ('get_all_projects_with_stats', database.get_all_projects_with_stats),
+        ('GET /api/servers', _get(client, '/api/servers')),
+        ('GET /api/servers page', _get(client, '/api/servers?limit=100&sort=hostname&status=Online')),
+        ('GET /api/stats', _get(client, '/api/stats')),
+        ('GET /api/projects/with-stats', _get(client, '/api/projects/with-stats')),
+    ]
+    if excel:
+        cases.append(('export excel', _get(client, '/api/export/excel')))
+        if first_proj is not None:
+            cases.append(('export project excel', _get(client, f'/api/export/excel/project/{first_proj}')))
+        cases.append(('export all-projects excel', _get(client, '/api/export/excel/all-projects')))
+
+    before = set(os.listdir(EXPORT_PATH)) if os.path.isdir(EXPORT_PATH) else set()
+    rows = []
+    try:
+        for name, fn in cases:
+            best = None
+            for _ in range(repeat):
+                elapsed, peak, _res = measure(fn)
+                if best is None or elapsed < best[0]:
+                    best = (elapsed, peak)
+            rows.append((name, best[0], best[1]))
+    finally:
+        _cleanup_exports(before)
+
+    return gen_time, rows
+
+
+def main():
+    ap = argparse.ArgumentParser(description='Time DB, API and export paths at several fleet sizes')
+    ap.add_argument('--sizes', default='1000,10000', help='comma separated fleet sizes')
+    ap.add_argument('--projects', type=int, default=20)
+    ap.add_argument('--repeat', type=int, default=1, help='runs per case, best time is reported')
+    ap.add_argument('--no-excel', action='store_true', help='skip Excel exports (slow on big fleets)')
+    args = ap.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(',') if s.strip()]
+
+    # Keep app logging out of the table
+    import logging
+    logging.disable(logging.INFO)
+
+    tracemalloc.start()
+    import database
+    if database.PERSISTENT_MODE:
+        # Every run wipes the DB - don't take a persisted inventory with it
+        print('Refusing to run with PERSISTENT_MODE=true (benchmark clears the database)')
+        sys.exit(1)
+    
+    # Hot queries must be index-backed, otherwise the timings below are meaningless
+    bad = [(sql, plan) for sql, ok, plan in database.check_query_plans() if not ok]
+    for sql, plan in bad:
+        print(f"FULL SCAN: {sql}\n    {plan}")
+    if bad:
+        sys.exit(1)
+    print('Query plans OK')
+    
+    try:
+        for size in sizes:
+            gen_time, rows = run_size(size, args.projects, not args.no_excel, args.repeat)
+            print(f"\n== {size} servers ({args.projects} projects, generated in {gen_time:.2f}s) ==")
+            print(f"{'case':<32}{'time (s)':>12}{'peak (MB)':>12}")
+            for name, elapsed, peak in rows:
+                print(f"{name:<32}{elapsed:>12.3f}{peak:>12.1f}")
+    finally:
+        tracemalloc.stop()
+        # Don't leave 100k fake servers behind
+        database.clear_all_data()
+
+
+if __name__ == '__main__':
+    main()
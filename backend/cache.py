@@ -0,0 +1,90 @@
+# In-process read cache for stats / listing queries
+# Entries belong to one data version - when the version moves, the whole cache is dropped
+
+import threading
+from collections import OrderedDict
+
+
+def _rows(value):
+    # Rough size of a cached result, in rows (what actually costs memory here)
+    if isinstance(value, list):
+        return max(1, len(value))
+    if isinstance(value, dict):
+        return 1 + sum(len(v) for v in value.values() if isinstance(v, list))
+    return 1
+
+
+class ReadCache:
+    """
+    LRU cache keyed by (query name, params), valid for a single data version.
+    Bounded by entry count and total cached rows. Values are shared, treat them as read-only.
+    """
+
+    def __init__(self, max_entries=256, max_rows=200000):
+        self.max_entries = max_entries
+        self.max_rows = max_rows
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = None
+        self._rows = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _check_version(self, version):
+        if version != self._version:
+            if self._data:
+                self.invalidations += 1
+            self._data.clear()
+            self._rows = 0
+            self._version = version
+
+    def get_or_load(self, key, version, loader):
+        with self._lock:
+            self._check_version(version)
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key][0]
+            self.misses += 1
+
+        # Load outside the lock so slow queries don't serialize readers
+        value = loader()
+        size = _rows(value)
+
+        with self._lock:
+            # Skip storing if a write moved the version meanwhile, or it can never fit
+            if version != self._version or size > self.max_rows:
+                return value
+            if key in self._data:
+                self._rows -= self._data.pop(key)[1]
+            self._data[key] = (value, size)
+            self._rows += size
+            while self._data and (len(self._data) > self.max_entries or self._rows > self.max_rows):
+                _k, (_v, s) = self._data.popitem(last=False)
+                self._rows -= s
+                self.evictions += 1
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._rows = 0
+            self._version = None
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'entries': len(self._data),
+                'rows': self._rows,
+                'max_entries': self.max_entries,
+                'max_rows': self.max_rows,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 3) if total else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'version': self._version,
+            }
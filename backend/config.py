@@ -24,6 +24,17 @@ USE_HTTPS = os.environ.get('USE_HTTPS', 'true').lower() != 'false'
 
 # DB
 DB_NAME = 'inventory.db'
+# Keep the inventory across restarts instead of wiping it at startup
+PERSISTENT_MODE = os.environ.get('PERSISTENT_MODE', 'false').lower() == 'true'
+# Run the DB in memory; it's saved to SNAPSHOT_NAME on demand, every SNAPSHOT_INTERVAL s and at exit
+IN_MEMORY_DB = os.environ.get('IN_MEMORY_DB', 'false').lower() == 'true'
+SNAPSHOT_NAME = 'inventory_snapshot.db'
+SNAPSHOT_INTERVAL = int(os.environ.get('SNAPSHOT_INTERVAL', '300'))
+# Max queued write operations the writer thread folds into one transaction
+WRITE_BATCH_MAX = 200
+# Read cache for stats / listings (dropped on every data change) - LRU beyond these bounds
+READ_CACHE_MAX_ENTRIES = 256
+READ_CACHE_MAX_ROWS = 200000
 
 # Encryption
 ENCRYPTION_KEY_FILE = '.encryption_key'
@@ -33,6 +44,23 @@ SCAN_WORKERS = {'small': 10, 'medium': 20, 'large': 30, 'xlarge': 50}
 SSH_TIMEOUT = 30
 WINRM_TIMEOUT = 30
 PORT_CHECK_TIMEOUT = 3
+# Scan-all persists results every N results or N seconds
+SCAN_SAVE_BATCH = 100
+SCAN_SAVE_INTERVAL = 2.0
+# Upper bound for one IP range request (a /10) - ranges are streamed, this just stops typos
+MAX_RANGE_IPS = 1 << 22
+# Plain (non-discovery) range import adds every IP as a server row with OS detection - a /16 at most
+MAX_IMPORT_IPS = 1 << 16
+# Discovery writes hits to the DB every N hits or every few seconds, whichever first
+DISCOVERY_BATCH_SIZE = 25
+DISCOVERY_FLUSH_SECS = 2
+# IPs with no server ports are skipped by discovery sweeps for this long
+DISCOVERY_NEGATIVE_TTL = 6 * 3600
+# Parallel OS auto-detect during imports
+OS_DETECT_WORKERS = 50
+# Server list paging (/api/servers?limit=...)
+PAGE_SIZE_DEFAULT = 100
+PAGE_SIZE_MAX = 1000
 
 def get_frontend_path():
     # Try env var first (Electron sets this)
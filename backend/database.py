@@ -3,17 +3,45 @@
 
 import sqlite3
 import os
-from datetime import datetime
+import logging
+import time
+import threading
+import json
+import base64
+import zlib
+import atexit
+import queue
+import functools
+import inspect
+from concurrent.futures import Future
+from datetime import datetime, timedelta
 from contextlib import contextmanager
 from encryption import encrypt_password, decrypt_password
-from config import get_data_path, DB_NAME
+from hardware import parse_nics, parse_disks, parse_memory, normalize_mac
+from cache import ReadCache
+from iprange import ip_to_int, parse_range
+from config import (
+    get_data_path, DB_NAME, PAGE_SIZE_DEFAULT, PAGE_SIZE_MAX, PERSISTENT_MODE,
+    IN_MEMORY_DB, SNAPSHOT_NAME, SNAPSHOT_INTERVAL, WRITE_BATCH_MAX,
+    READ_CACHE_MAX_ENTRIES, READ_CACHE_MAX_ROWS
+)
 
-DB_PATH = os.path.join(get_data_path(), DB_NAME)
+# In-memory mode uses the memdb VFS: one named DB shared by every connection in the
+# process, with normal file-style locking (busy_timeout works, unlike cache=shared)
+MEMORY_DB_URI = 'file:/serverspy_inventory?vfs=memdb'
+
+DB_PATH = MEMORY_DB_URI if IN_MEMORY_DB else os.path.join(get_data_path(), DB_NAME)
+SNAPSHOT_PATH = os.path.join(get_data_path(), SNAPSHOT_NAME)
+
+
+def is_memory_db():
+    return DB_PATH.startswith('file:') and 'vfs=memdb' in DB_PATH
 
 
 def ensure_db_directory():
     import logging
-    db_dir = os.path.dirname(DB_PATH)
+    # In memory mode the data dir is still needed for snapshots
+    db_dir = get_data_path() if is_memory_db() else os.path.dirname(DB_PATH)
     if not os.path.exists(db_dir):
         try:
             os.makedirs(db_dir, exist_ok=True)
@@ -27,113 +55,1111 @@ def ensure_db_directory():
         raise PermissionError(f"Cannot write to: {db_dir}")
 
 
+# One connection per thread, opened lazily and kept for the thread's lifetime.
+# Pragmas are applied once per connection; WAL lets readers run during scan writes.
+# Only the writer thread (DbWriter below) gets a writable connection.
+_local = threading.local()
+
+
+def _ip_num(ip):
+    # SQL ip_num(ip): dotted IPv4 -> integer, NULL if it isn't one (subnet matching)
+    try:
+        return ip_to_int(ip)
+    except (ValueError, TypeError):
+        return None
+
+
+def _open_connection(readonly=True):
+    import logging
+    logging.debug(f"DB connect: {DB_PATH}")
+    conn = sqlite3.connect(DB_PATH, timeout=30, uri=True)
+    conn.row_factory = sqlite3.Row
+    if not is_memory_db():
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute('PRAGMA busy_timeout=30000')
+    conn.create_function('ip_num', 1, _ip_num, deterministic=True)
+    if readonly:
+        conn.execute('PRAGMA query_only=ON')
+    return conn
+
+
+def _thread_connection():
+    conn = getattr(_local, 'conn', None)
+    # Reconnect if DB_PATH was switched (benchmarks / fleet generator)
+    if conn is None or _local.path != DB_PATH:
+        if conn is not None:
+            conn.close()
+        writer = _writer.is_writer_thread()
+        if writer:
+            # First writable connection must find the data dir (fresh install / new DB_PATH)
+            ensure_db_directory()
+        conn = _open_connection(readonly=not writer)
+        _local.conn = conn
+        _local.path = DB_PATH
+        _local.depth = 0
+    return conn
+
+
+def close_db_connection():
+    # Drop this thread's connection (next get_db_connection reopens)
+    conn = getattr(_local, 'conn', None)
+    if conn is not None:
+        conn.close()
+        _local.conn = None
+
+
 @contextmanager
 def get_db_connection():
     import logging
     try:
-        ensure_db_directory()
-        logging.debug(f"DB connect: {DB_PATH}")
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
-        try:
-            yield conn
-            conn.commit()
-        except Exception as e:
-            conn.rollback()
-            logging.error(f"DB error: {e}", exc_info=True)
-            raise
-        finally:
-            conn.close()
+        conn = _thread_connection()
     except sqlite3.OperationalError as e:
         logging.error(f"DB op error: {e}. Path: {DB_PATH}", exc_info=True)
         raise
     except Exception as e:
         logging.error(f"DB connection error: {e}. Path: {DB_PATH}", exc_info=True)
         raise
+    
+    # Nested use on the same thread joins the outer transaction
+    _local.depth += 1
+    try:
+        yield conn
+        if _local.depth == 1:
+            conn.commit()
+    except Exception as e:
+        if _local.depth == 1:
+            conn.rollback()
+        logging.error(f"DB error: {e}", exc_info=True)
+        raise
+    finally:
+        _local.depth -= 1
 
 
-def init_db():
+class DbWriter:
+    # The one writer thread: drains queued ops into one transaction, a savepoint per op so a failing op rolls back alone
+    
+    def __init__(self, batch_max=WRITE_BATCH_MAX):
+        self.batch_max = batch_max
+        self.queue = queue.Queue()
+        self.thread = None
+        self._start_lock = threading.Lock()
+    
+    def is_writer_thread(self):
+        return self.thread is not None and threading.current_thread() is self.thread
+    
+    def start(self):
+        with self._start_lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._loop, daemon=True, name='db-writer')
+                self.thread.start()
+    
+    def submit(self, fn, *args, **kwargs):
+        fut = Future()
+        # A write op calling another write op: already inside the batch, just run it
+        if self.is_writer_thread():
+            try:
+                fut.set_result(fn(*args, **kwargs))
+            except Exception as e:
+                fut.set_exception(e)
+            return fut
+        self.start()
+        self.queue.put((fn, args, kwargs, fut))
+        return fut
+    
+    def stop(self, timeout=10):
+        # Finish what's queued, then end the thread (atexit)
+        if self.thread is not None and self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join(timeout)
+    
+    def _loop(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            ops = [item]
+            stop = False
+            while len(ops) < self.batch_max:
+                try:
+                    nxt = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if nxt is None:
+                    stop = True
+                    break
+                ops.append(nxt)
+            self._run_batch(ops)
+            if stop:
+                return
+    
+    def _run_batch(self, ops):
+        done = []
+        try:
+            conn = _thread_connection()
+            conn.execute('BEGIN IMMEDIATE')
+        except Exception as e:
+            logging.error(f"DB writer: cannot start transaction: {e}", exc_info=True)
+            for _fn, _a, _kw, fut in ops:
+                fut.set_exception(e)
+            return
+        
+        # depth > 0: get_db_connection inside the ops joins this transaction
+        _local.depth += 1
+        try:
+            for fn, args, kwargs, fut in ops:
+                conn.execute('SAVEPOINT write_op')
+                try:
+                    res = fn(*args, **kwargs)
+                    conn.execute('RELEASE write_op')
+                    done.append((fut, res, None))
+                except Exception as e:
+                    conn.execute('ROLLBACK TO write_op')
+                    conn.execute('RELEASE write_op')
+                    done.append((fut, None, e))
+            conn.commit()
+        except Exception as e:
+            logging.error(f"DB writer: batch of {len(ops)} failed: {e}", exc_info=True)
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+            done = [(fut, None, e) for _fn, _a, _kw, fut in ops]
+        finally:
+            _local.depth -= 1
+        
+        # Resolve only after commit, so a caller never sees a result that could still roll back
+        for fut, res, err in done:
+            if err is not None:
+                fut.set_exception(err)
+            else:
+                fut.set_result(res)
+
+
+_writer = DbWriter()
+atexit.register(_writer.stop)
+
+
+def submit_write(fn, *args, **kwargs):
+    # Queue a write operation, returns a concurrent.futures.Future
+    return _writer.submit(fn, *args, **kwargs)
+
+
+def run_write(fn, *args, **kwargs):
+    # Queue a write operation and wait for its (committed) result
+    return submit_write(fn, *args, **kwargs).result()
+
+
+def writes(fn):
+    # Run fn on the writer thread (blocks until committed; fn.submit gives a Future) - keep crypto/slow work out of fn
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        return run_write(fn, *args, **kwargs)
+    wrapper.submit = lambda *args, **kwargs: submit_write(fn, *args, **kwargs)
+    return wrapper
+
+
+def _migrate_base(cur):
+    # Projects table
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS projects (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT UNIQUE NOT NULL,
+            created_at TEXT
+        )
+    ''')
+    
+    # Servers table
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS servers (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            ip TEXT UNIQUE NOT NULL,
+            username TEXT DEFAULT '',
+            password TEXT DEFAULT '',
+            os_type TEXT DEFAULT 'Windows',
+            hostname TEXT, domain TEXT, brand TEXT, model TEXT, serial TEXT,
+            motherboard TEXT, cpu_count INTEGER, cpu_cores TEXT,
+            cpu_logical_processors TEXT, cpu_model TEXT, ram_physical TEXT,
+            ram_logical INTEGER, disk_info TEXT, network_primary TEXT,
+            network_all TEXT, os_version TEXT, service_pack TEXT,
+            status TEXT DEFAULT 'Not Scanned', last_scan TEXT,
+            created_at TEXT, updated_at TEXT, project_id INTEGER DEFAULT NULL,
+            FOREIGN KEY (project_id) REFERENCES projects(id)
+        )
+    ''')
+    
+    # Migration for project_id
+    try:
+        cur.execute('ALTER TABLE servers ADD COLUMN project_id INTEGER DEFAULT NULL')
+    except sqlite3.OperationalError:
+        pass
+
+
+def _migrate_discovery_cache(cur):
+    # Negative discovery cache - IPs that had no server ports open last time
+    # Keyed by integer IP so range lookups are a simple BETWEEN
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS discovery_cache (
+            ip_num INTEGER PRIMARY KEY,
+            checked_at TEXT
+        )
+    ''')
+
+
+def _migrate_project_stats(cur):
+    # Materialized per-project status counters, kept current by triggers
+    # project_key 0 = unassigned (project ids start at 1)
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS project_stats (
+            project_key INTEGER PRIMARY KEY,
+            total INTEGER NOT NULL DEFAULT 0,
+            online INTEGER NOT NULL DEFAULT 0,
+            offline INTEGER NOT NULL DEFAULT 0,
+            not_scanned INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    for sql in STATS_TRIGGERS:
+        cur.execute(sql)
+    rebuild_project_stats(cur)
+
+
+def _migrate_search(cur):
+    # Full-text index over inventory fields (external content, rowid = servers.id)
+    cur.execute(f'''
+        CREATE VIRTUAL TABLE IF NOT EXISTS servers_fts USING fts5(
+            {', '.join(SEARCH_FIELDS)}, content='servers', content_rowid='id'
+        )
+    ''')
+    for sql in SEARCH_TRIGGERS:
+        cur.execute(sql)
+    cur.execute("INSERT INTO servers_fts (servers_fts) VALUES ('rebuild')")
+
+
+def _migrate_hardware(cur):
+    # Normalized hardware, one row per NIC / disk / RAM module (rewritten on every scan)
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS server_nics (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            server_id INTEGER NOT NULL REFERENCES servers(id),
+            idx INTEGER NOT NULL,
+            ip TEXT, subnet TEXT, gateway TEXT, mac TEXT
+        )
+    ''')
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS server_disks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            server_id INTEGER NOT NULL REFERENCES servers(id),
+            idx INTEGER NOT NULL,
+            name TEXT, model TEXT, size_gb REAL
+        )
+    ''')
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS server_memory_modules (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            server_id INTEGER NOT NULL REFERENCES servers(id),
+            slot INTEGER NOT NULL,
+            size_gb REAL
+        )
+    ''')
+    for sql in HARDWARE_SCHEMA:
+        cur.execute(sql)
+    rebuild_hardware_tables(cur)
+
+
+def _migrate_history(cur):
+    # Per-scan change log: only fields that changed since the previous state, zlib'd JSON
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS scan_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            server_id INTEGER NOT NULL,
+            scanned_at TEXT NOT NULL,
+            delta BLOB NOT NULL
+        )
+    ''')
+    cur.execute('CREATE INDEX IF NOT EXISTS idx_history_server_time ON scan_history (server_id, scanned_at)')
+    # Ids are reused after a wipe, so history goes with the server
+    cur.execute('CREATE TRIGGER IF NOT EXISTS trg_servers_history_del AFTER DELETE ON servers '
+                'BEGIN DELETE FROM scan_history WHERE server_id = OLD.id; END')
+
+
+def _migrate_data_version(cur):
+    # Single-row counter bumped by triggers on every servers/projects change (ETags, read cache)
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS data_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL
+        )
+    ''')
+    cur.execute('INSERT OR IGNORE INTO data_version (id, version) VALUES (1, 0)')
+    for table in ('servers', 'projects'):
+        for event in ('INSERT', 'UPDATE', 'DELETE'):
+            cur.execute(f'CREATE TRIGGER IF NOT EXISTS trg_{table}_version_{event.lower()} '
+                        f'AFTER {event} ON {table} BEGIN UPDATE data_version SET version = version + 1; END')
+
+
+def _migrate_credential_profiles(cur):
+    # Shared credentials - servers point at a profile instead of carrying their own ciphertext
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS credential_profiles (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT UNIQUE NOT NULL,
+            username TEXT NOT NULL DEFAULT '',
+            password TEXT NOT NULL DEFAULT '',
+            created_at TEXT,
+            updated_at TEXT
+        )
+    ''')
+    try:
+        cur.execute('ALTER TABLE servers ADD COLUMN credential_profile_id INTEGER DEFAULT NULL')
+    except sqlite3.OperationalError:
+        pass
+    # Stands in for ON DELETE SET NULL (foreign_keys is off)
+    cur.execute('CREATE TRIGGER IF NOT EXISTS trg_profiles_del AFTER DELETE ON credential_profiles '
+                'BEGIN UPDATE servers SET credential_profile_id = NULL WHERE credential_profile_id = OLD.id; END')
+
+
+# Schema migrations, applied in order; PRAGMA user_version = how many have run.
+# Append only - every step must also be safe on a DB that predates versioning (IF NOT EXISTS).
+MIGRATIONS = [
+    _migrate_base,
+    _migrate_discovery_cache,
+    _migrate_project_stats,
+    _migrate_search,
+    _migrate_hardware,
+    _migrate_history,
+    _migrate_data_version,
+    _migrate_credential_profiles,
+]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+# Memory DB lives as long as one connection to it is open - this one is never closed.
+# It never writes after startup, so its PRAGMA data_version moves only when others commit.
+_memory_keeper = None
+_snapshot_version = None
+_snapshot_lock = threading.RLock()
+
+
+def _keeper_version():
+    with _snapshot_lock:
+        return _memory_keeper.execute('PRAGMA data_version').fetchone()[0]
+
+
+def snapshot_db(path=None):
+    # Copy the live DB to path via the backup API - temp file first so a crash never leaves a broken snapshot
+    global _snapshot_version
+    path = path or SNAPSHOT_PATH
+    tmp = path + '.tmp'
+    with _snapshot_lock:
+        t0 = time.perf_counter()
+        ver = _keeper_version() if _memory_keeper is not None else None
+        src = _open_connection()
+        try:
+            dst = sqlite3.connect(tmp)
+            try:
+                src.backup(dst)
+            finally:
+                dst.close()
+        finally:
+            src.close()
+        os.replace(tmp, path)
+        if path == SNAPSHOT_PATH:
+            _snapshot_version = ver
+        elapsed = time.perf_counter() - t0
+    logging.info(f"DB snapshot -> {path} ({elapsed:.2f}s)")
+    return {'path': path, 'size_bytes': os.path.getsize(path), 'seconds': round(elapsed, 3)}
+
+
+def snapshot_if_changed():
+    # Timer / exit snapshots: skip when nothing was committed since the last one
+    if _memory_keeper is None or _keeper_version() == _snapshot_version:
+        return None
+    return snapshot_db()
+
+
+def mark_snapshot_clean():
+    # Current memory state counts as saved (after startup restore / wipe)
+    global _snapshot_version
+    if _memory_keeper is not None:
+        _snapshot_version = _keeper_version()
+
+
+def restore_snapshot(conn, path=None):
+    # Load a snapshot file into `conn` (the empty memory DB at startup)
+    src = sqlite3.connect(path or SNAPSHOT_PATH)
+    try:
+        src.backup(conn)
+    finally:
+        src.close()
+
+
+def _snapshot_loop(interval):
+    while True:
+        time.sleep(interval)
+        try:
+            snapshot_if_changed()
+        except Exception as e:
+            logging.error(f"Scheduled snapshot failed: {e}", exc_info=True)
+
+
+def _snapshot_at_exit():
+    # Registered after the writer's own stop hook, so atexit runs this one first -
+    # drain the queued writes here, or they'd miss the final snapshot
+    try:
+        _writer.stop()
+        snapshot_if_changed()
+    except Exception as e:
+        logging.error(f"Snapshot at exit failed: {e}", exc_info=True)
+
+
+def start_memory_db():
+    # In-memory mode: pin the memory DB open, load the last snapshot if persistent, schedule snapshots
+    global _memory_keeper
+    if _memory_keeper is not None:
+        return
     ensure_db_directory()
+    _memory_keeper = sqlite3.connect(DB_PATH, uri=True, check_same_thread=False)
+    if PERSISTENT_MODE and os.path.exists(SNAPSHOT_PATH):
+        restore_snapshot(_memory_keeper)
+        logging.info(f"Loaded snapshot {SNAPSHOT_PATH} into memory")
+    atexit.register(_snapshot_at_exit)
+    if SNAPSHOT_INTERVAL > 0:
+        threading.Thread(target=_snapshot_loop, args=(SNAPSHOT_INTERVAL,), daemon=True,
+                         name='db-snapshot').start()
+
+
+def get_data_version():
+    # Goes up on every committed change to servers or projects
+    with get_db_connection() as conn:
+        return conn.execute('SELECT version FROM data_version WHERE id = 1').fetchone()[0]
+
+
+read_cache = ReadCache(READ_CACHE_MAX_ENTRIES, READ_CACHE_MAX_ROWS)
+
+
+def _freeze(value):
+    # Hashable cache key part
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    return value
+
+
+def cached_read(fn):
+    # Serve fn from read_cache while data_version is unchanged; calls asking for credentials skip the cache
+    sig = inspect.signature(fn)
+    
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        bound = sig.bind(*args, **kwargs)
+        bound.apply_defaults()
+        if bound.arguments.get('with_credentials'):
+            return fn(*args, **kwargs)
+        key = (fn.__name__, _freeze(bound.arguments))
+        return read_cache.get_or_load(key, get_data_version(), lambda: fn(*args, **kwargs))
+    return wrapper
+
+
+def get_schema_version():
+    with get_db_connection() as conn:
+        return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+@writes
+def init_db():
     with get_db_connection() as conn:
         cur = conn.cursor()
+        ver = cur.execute('PRAGMA user_version').fetchone()[0]
+        if ver > SCHEMA_VERSION:
+            raise RuntimeError(f'Database schema v{ver} is newer than this app (v{SCHEMA_VERSION})')
+        
+        for v in range(ver, SCHEMA_VERSION):
+            logging.info(f"DB migration {v + 1}/{SCHEMA_VERSION}: {MIGRATIONS[v].__name__}")
+            MIGRATIONS[v](cur)
+            cur.execute(f'PRAGMA user_version = {v + 1}')
         
-        # Projects table
+        # Cheap and idempotent - keeps managed indexes in line with SERVER_INDEXES
+        sync_indexes(cur)
+        
+
+
+# Managed secondary indexes on servers - name -> columns
+# Plain project_id index keeps rows in id order per project (no sort for ORDER BY id)
+SERVER_INDEXES = {
+    'idx_servers_project': 'project_id',
+    'idx_servers_project_status': 'project_id, status',
+    'idx_servers_status': 'status',
+    'idx_servers_last_scan': 'last_scan',
+    'idx_servers_project_last_scan': 'project_id, last_scan',
+    'idx_servers_hostname': 'hostname',
+    'idx_servers_serial': 'serial',
+    'idx_servers_credential_profile': 'credential_profile_id',
+}
+
+
+def sync_indexes(cur):
+    # Create missing managed indexes, drop ones we no longer manage
+    cur.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'servers' AND name LIKE 'idx_servers_%'")
+    for (name,) in cur.fetchall():
+        if name not in SERVER_INDEXES:
+            cur.execute(f'DROP INDEX IF EXISTS {name}')
+    for name, cols in SERVER_INDEXES.items():
+        cur.execute(f'CREATE INDEX IF NOT EXISTS {name} ON servers ({cols})')
+
+
+def _stats_delta(row, sign):
+    # SQL fragments for adding (sign '+') or removing (sign '-') one server from its counters
+    key = f'COALESCE({row}.project_id, 0)'
+    return (
+        f'INSERT OR IGNORE INTO project_stats (project_key) VALUES ({key});'
+        f'UPDATE project_stats SET total = total {sign} 1,'
+        f" online = online {sign} ({row}.status = 'Online'),"
+        f" offline = offline {sign} ({row}.status = 'Offline'),"
+        f" not_scanned = not_scanned {sign} ({row}.status = 'Not Scanned')"
+        f' WHERE project_key = {key};'
+    )
+
+
+STATS_TRIGGERS = [
+    f'CREATE TRIGGER IF NOT EXISTS trg_servers_stats_ins AFTER INSERT ON servers BEGIN {_stats_delta("NEW", "+")} END',
+    f'CREATE TRIGGER IF NOT EXISTS trg_servers_stats_del AFTER DELETE ON servers BEGIN {_stats_delta("OLD", "-")} END',
+    f'''CREATE TRIGGER IF NOT EXISTS trg_servers_stats_upd AFTER UPDATE OF status, project_id ON servers
+       WHEN OLD.status IS NOT NEW.status OR OLD.project_id IS NOT NEW.project_id
+       BEGIN {_stats_delta("OLD", "-")} {_stats_delta("NEW", "+")} END''',
+]
+
+
+HARDWARE_TABLES = ('server_nics', 'server_disks', 'server_memory_modules')
+
+# Child-table indexes, plus a delete trigger standing in for ON DELETE CASCADE (foreign_keys is off)
+HARDWARE_SCHEMA = [
+    'CREATE INDEX IF NOT EXISTS idx_nics_server ON server_nics (server_id)',
+    'CREATE INDEX IF NOT EXISTS idx_nics_mac ON server_nics (mac)',
+    'CREATE INDEX IF NOT EXISTS idx_nics_ip ON server_nics (ip)',
+    'CREATE INDEX IF NOT EXISTS idx_disks_server ON server_disks (server_id)',
+    'CREATE INDEX IF NOT EXISTS idx_memory_server ON server_memory_modules (server_id)',
+    f'''CREATE TRIGGER IF NOT EXISTS trg_servers_hw_del AFTER DELETE ON servers BEGIN
+       {' '.join(f'DELETE FROM {t} WHERE server_id = OLD.id;' for t in HARDWARE_TABLES)} END''',
+]
+
+
+def _hardware_rows(srv_id, data):
+    # Child rows for one scan result, parsed from the same strings that go into servers
+    nics = [(srv_id, i) + n for i, n in enumerate(parse_nics(data.get('network_all')))]
+    disks = [(srv_id, i) + d for i, d in enumerate(parse_disks(data.get('disk_info')))]
+    mem = [(srv_id, i, size) for i, size in enumerate(parse_memory(data.get('ram_physical')))]
+    return nics, disks, mem
+
+
+def save_hardware(cur, items):
+    # Replace the child rows of each (srv_id, data) in items - caller owns the transaction
+    ids, nics, disks, mem = [], [], [], []
+    for srv_id, data in items:
+        n, d, m = _hardware_rows(srv_id, data)
+        ids.append((srv_id,))
+        nics += n
+        disks += d
+        mem += m
+    if not ids:
+        return
+    for t in HARDWARE_TABLES:
+        cur.executemany(f'DELETE FROM {t} WHERE server_id = ?', ids)
+    cur.executemany('INSERT INTO server_nics (server_id, idx, ip, subnet, gateway, mac) VALUES (?, ?, ?, ?, ?, ?)', nics)
+    cur.executemany('INSERT INTO server_disks (server_id, idx, name, model, size_gb) VALUES (?, ?, ?, ?, ?)', disks)
+    cur.executemany('INSERT INTO server_memory_modules (server_id, slot, size_gb) VALUES (?, ?, ?)', mem)
+
+
+def rebuild_hardware_tables(cur=None):
+    # Re-derive all child rows from the legacy text columns (first run / bulk loads)
+    if cur is None:
+        return run_write(lambda: rebuild_hardware_tables(_thread_connection().cursor()))
+    for t in HARDWARE_TABLES:
+        cur.execute(f'DELETE FROM {t}')
+    cur.execute("SELECT id, network_all, disk_info, ram_physical FROM servers WHERE last_scan IS NOT NULL")
+    while True:
+        chunk = cur.fetchmany(5000)
+        if not chunk:
+            break
+        save_hardware(cur.connection.cursor(), [(r['id'], dict(r)) for r in chunk])
+
+
+def get_server_hardware(srv_id):
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute('SELECT idx, ip, subnet, gateway, mac FROM server_nics WHERE server_id = ? ORDER BY idx', (srv_id,))
+        nics = [dict(r) for r in cur.fetchall()]
+        cur.execute('SELECT idx, name, model, size_gb FROM server_disks WHERE server_id = ? ORDER BY idx', (srv_id,))
+        disks = [dict(r) for r in cur.fetchall()]
+        cur.execute('SELECT slot, size_gb FROM server_memory_modules WHERE server_id = ? ORDER BY slot', (srv_id,))
+        mem = [dict(r) for r in cur.fetchall()]
+    return {'nics': nics, 'disks': disks, 'memory_modules': mem}
+
+
+def find_servers_by_mac(mac):
+    # Which host(s) own this MAC - index lookup on server_nics
+    with get_db_connection() as conn:
+        cur = conn.cursor()
         cur.execute('''
-            CREATE TABLE IF NOT EXISTS projects (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT UNIQUE NOT NULL,
-                created_at TEXT
+            SELECT s.id, s.ip, s.hostname, s.project_id, n.ip AS nic_ip, n.mac
+            FROM server_nics n JOIN servers s ON s.id = n.server_id
+            WHERE n.mac = ?
+            ORDER BY s.id
+        ''', (normalize_mac(mac),))
+        return [dict(r) for r in cur.fetchall()]
+
+
+# Placeholder values that must not link unrelated machines
+JUNK_SERIALS = (
+    '', 'N/A', 'NONE', '0', '0123456789', 'DEFAULT STRING', 'NOT SPECIFIED',
+    'TO BE FILLED BY O.E.M.', 'SYSTEM SERIAL NUMBER', 'CHASSIS SERIAL NUMBER'
+)
+JUNK_MACS = ('', '00:00:00:00:00:00', 'FF:FF:FF:FF:FF:FF')
+JUNK_HOSTNAMES = ('', 'localhost', 'localhost.localdomain', 'n/a')
+
+
+def get_host_alias_groups(server_ids=None):
+    # Same physical box under several IPs: shared serial or MAC, transitively; different real
+    # serials never link. Servers listed best-first (Online, newest scan) -> [{servers, matched_on}]
+    def marks(values):
+        return ', '.join('?' * len(values))
+    
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(f'''
+            SELECT kind, GROUP_CONCAT(DISTINCT id) AS ids FROM (
+                SELECT id, 'serial' AS kind, UPPER(TRIM(serial)) AS k FROM servers
+                WHERE serial IS NOT NULL AND UPPER(TRIM(serial)) NOT IN ({marks(JUNK_SERIALS)})
+                UNION ALL
+                SELECT server_id, 'mac', mac FROM server_nics
+                WHERE mac IS NOT NULL AND mac NOT IN ({marks(JUNK_MACS)})
+                UNION ALL
+                SELECT id, 'hostname', LOWER(TRIM(hostname)) || '.' || LOWER(COALESCE(TRIM(domain), '')) FROM servers
+                WHERE hostname IS NOT NULL AND LOWER(TRIM(hostname)) NOT IN ({marks(JUNK_HOSTNAMES)})
             )
-        ''')
+            GROUP BY kind, k
+            HAVING COUNT(DISTINCT id) > 1
+        ''', JUNK_SERIALS + JUNK_MACS + JUNK_HOSTNAMES)
+        # Serial links first, so a MAC match can't pull in a box with a different serial.
+        # Hostnames repeat across unrelated boxes (e.g. 'ubuntu' with serial/domain 'N/A'),
+        # so a hostname match only confirms a group that a serial or MAC already formed
+        order = {'serial': 0, 'mac': 1, 'hostname': 2}
+        links = sorted(((r['kind'], [int(x) for x in r['ids'].split(',')]) for r in cur.fetchall()),
+                       key=lambda link: order[link[0]])
+        
+        # Real serial per linked server - two different ones mean two different machines
+        linked = sorted({i for _kind, ids in links for i in ids})
+        serial_of = {}
+        for i in range(0, len(linked), 500):
+            chunk = linked[i:i + 500]
+            cur.execute(f'''
+                SELECT id, UPPER(TRIM(serial)) AS serial FROM servers
+                WHERE id IN ({marks(chunk)}) AND serial IS NOT NULL
+                  AND UPPER(TRIM(serial)) NOT IN ({marks(JUNK_SERIALS)}) AND TRIM(serial) != ''
+            ''', chunk + list(JUNK_SERIALS))
+            serial_of.update((r['id'], r['serial']) for r in cur.fetchall())
+        
+        # Union-find over the shared keys; each root carries its group's serial
+        parent = {}
+        def find(x):
+            parent.setdefault(x, x)
+            while parent[x] != x:
+                parent[x] = parent[parent[x]]
+                x = parent[x]
+            return x
+        kinds = {}
+        for kind, ids in links:
+            for other in ids[1:]:
+                a, b = find(ids[0]), find(other)
+                if a == b:
+                    kinds.setdefault(a, set()).add(kind)
+                    continue
+                if kind == 'hostname':
+                    continue
+                sa, sb = serial_of.get(a), serial_of.get(b)
+                if sa and sb and sa != sb:
+                    continue
+                parent[b] = a
+                serial_of[a] = sa or sb
+                kinds.setdefault(a, set()).update({kind} | kinds.pop(b, set()))
+        
+        groups = {}
+        for x in list(parent):
+            groups.setdefault(find(x), set()).add(x)
         
-        # Servers table
+        scope = set(server_ids) if server_ids is not None else None
+        wanted = []
+        for root, ids in groups.items():
+            if scope is not None:
+                ids = ids & scope
+            if len(ids) > 1:
+                wanted.append((root, sorted(ids)))
+        
+        rows = {}
+        all_ids = [i for _root, ids in wanted for i in ids]
+        for i in range(0, len(all_ids), 500):
+            chunk = all_ids[i:i + 500]
+            cur.execute(f'''
+                SELECT id, ip, hostname, domain, serial, status, last_scan, project_id
+                FROM servers WHERE id IN ({marks(chunk)})
+            ''', chunk)
+            rows.update((r['id'], dict(r)) for r in cur.fetchall())
+    
+    def best_first(srv):
+        return (srv['status'] != 'Online', -_ts_key(srv['last_scan']), srv['id'])
+    
+    out = []
+    for root, ids in sorted(wanted, key=lambda g: g[1][0]):
+        members = sorted((rows[i] for i in ids if i in rows), key=best_first)
+        if len(members) > 1:
+            out.append({'servers': members, 'matched_on': sorted(kinds.get(root, ()))})
+    return out
+
+
+def _ts_key(ts):
+    # ISO timestamp -> sortable number (0 when never scanned)
+    try:
+        return datetime.fromisoformat(ts).timestamp() if ts else 0
+    except ValueError:
+        return 0
+
+
+def get_hardware_totals_by_project():
+    # Disk / RAM capacity per project (None = unassigned), summed in SQL
+    with get_db_connection() as conn:
+        cur = conn.cursor()
         cur.execute('''
-            CREATE TABLE IF NOT EXISTS servers (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                ip TEXT UNIQUE NOT NULL,
-                username TEXT DEFAULT '',
-                password TEXT DEFAULT '',
-                os_type TEXT DEFAULT 'Windows',
-                hostname TEXT, domain TEXT, brand TEXT, model TEXT, serial TEXT,
-                motherboard TEXT, cpu_count INTEGER, cpu_cores TEXT,
-                cpu_logical_processors TEXT, cpu_model TEXT, ram_physical TEXT,
-                ram_logical INTEGER, disk_info TEXT, network_primary TEXT,
-                network_all TEXT, os_version TEXT, service_pack TEXT,
-                status TEXT DEFAULT 'Not Scanned', last_scan TEXT,
-                created_at TEXT, updated_at TEXT, project_id INTEGER DEFAULT NULL,
-                FOREIGN KEY (project_id) REFERENCES projects(id)
-            )
+            SELECT s.project_id, COUNT(d.id) AS disks, COALESCE(SUM(d.size_gb), 0) AS disk_gb
+            FROM server_disks d JOIN servers s ON s.id = d.server_id
+            GROUP BY s.project_id
         ''')
+        out = {r['project_id']: {'disks': r['disks'], 'disk_gb': round(r['disk_gb'], 1),
+                                 'memory_modules': 0, 'memory_gb': 0} for r in cur.fetchall()}
+        cur.execute('''
+            SELECT s.project_id, COUNT(m.id) AS modules, COALESCE(SUM(m.size_gb), 0) AS memory_gb
+            FROM server_memory_modules m JOIN servers s ON s.id = m.server_id
+            GROUP BY s.project_id
+        ''')
+        for r in cur.fetchall():
+            t = out.setdefault(r['project_id'], {'disks': 0, 'disk_gb': 0})
+            t['memory_modules'] = r['modules']
+            t['memory_gb'] = round(r['memory_gb'], 1)
+    return out
+
+
+# Fields mirrored into servers_fts
+SEARCH_FIELDS = [
+    'hostname', 'ip', 'domain', 'brand', 'model', 'serial', 'cpu_model',
+    'os_version', 'disk_info', 'network_primary', 'network_all'
+]
+
+
+def _fts_row(row, delete=False):
+    # INSERT into servers_fts for NEW/OLD; external content needs the old values to delete
+    cols = ', '.join(SEARCH_FIELDS)
+    vals = ', '.join(f'{row}.{c}' for c in SEARCH_FIELDS)
+    if delete:
+        return f"INSERT INTO servers_fts (servers_fts, rowid, {cols}) VALUES ('delete', {row}.id, {vals});"
+    return f'INSERT INTO servers_fts (rowid, {cols}) VALUES ({row}.id, {vals});'
+
+
+# Status-only updates (the common case during scans) don't touch the index
+SEARCH_TRIGGERS = [
+    f'CREATE TRIGGER IF NOT EXISTS trg_servers_fts_ins AFTER INSERT ON servers BEGIN {_fts_row("NEW")} END',
+    f'CREATE TRIGGER IF NOT EXISTS trg_servers_fts_del AFTER DELETE ON servers BEGIN {_fts_row("OLD", True)} END',
+    f'''CREATE TRIGGER IF NOT EXISTS trg_servers_fts_upd AFTER UPDATE OF {', '.join(SEARCH_FIELDS)} ON servers
+       BEGIN {_fts_row("OLD", True)} {_fts_row("NEW")} END''',
+]
+
+
+def fts_query(text):
+    # Free text -> FTS5 MATCH: every word must match as a prefix ('R740 2012', partial MAC/IP). None if nothing searchable
+    terms = []
+    for word in (text or '').split():
+        if any(ch.isalnum() for ch in word):
+            terms.append('"' + word.replace('"', '""') + '"*')
+    return ' '.join(terms) or None
+
+
+@writes
+def rebuild_search_index():
+    with get_db_connection() as conn:
+        conn.execute("INSERT INTO servers_fts (servers_fts) VALUES ('rebuild')")
+
+
+def search_servers(text, limit=50, project=None):
+    # Ranked full-text search (bm25, best first); project: None = all, 'unassigned' or an id
+    match = fts_query(text)
+    if not match:
+        return {'servers': [], 'total': 0}
+    
+    where, params = ['servers_fts MATCH ?'], [match]
+    if project == 'unassigned':
+        where.append('s.project_id IS NULL')
+    elif project is not None:
+        where.append('s.project_id = ?')
+        params.append(int(project))
+    cond = ' AND '.join(where)
+    cols = ', '.join(f's.{c}' for c in LIST_COLUMNS)
+    
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(f'SELECT COUNT(*) FROM servers_fts JOIN servers s ON s.id = servers_fts.rowid WHERE {cond}', params)
+        total = cur.fetchone()[0]
+        cur.execute(f'''
+            SELECT {cols}, COALESCE(p.name, '') AS project_name, servers_fts.rank AS rank
+            FROM servers_fts
+            JOIN servers s ON s.id = servers_fts.rowid
+            LEFT JOIN projects p ON p.id = s.project_id
+            WHERE {cond}
+            ORDER BY servers_fts.rank
+            LIMIT ?
+        ''', params + [max(1, min(int(limit), PAGE_SIZE_MAX))])
+        rows = [dict(r) for r in cur.fetchall()]
+    
+    return {'servers': rows, 'total': total}
+
+
+def rebuild_project_stats(cur=None):
+    # Recount project_stats from the servers table
+    if cur is None:
+        return run_write(lambda: rebuild_project_stats(_thread_connection().cursor()))
+    cur.execute('DELETE FROM project_stats')
+    cur.execute(f'''
+        INSERT INTO project_stats (project_key, total, online, offline, not_scanned)
+        SELECT COALESCE(project_id, 0), total, online, offline, not_scanned
+        FROM (SELECT project_id, {STATS_COLS} FROM servers GROUP BY project_id)
+    ''')
+
+
+def check_project_stats(repair=False):
+    # Compare the trigger-maintained counters with a full recount
+    # Returns {'consistent': bool, 'mismatches': [...], 'repaired': bool}
+    fields = ('total', 'online', 'offline', 'not_scanned')
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(f'SELECT COALESCE(project_id, 0) AS k, {STATS_COLS} FROM servers GROUP BY project_id')
+        actual = {r['k']: tuple(r[f] for f in fields) for r in cur.fetchall()}
+        cur.execute('SELECT * FROM project_stats')
+        stored = {r['project_key']: tuple(r[f] for f in fields) for r in cur.fetchall()}
         
-        # Migration for project_id
-        try:
-            cur.execute('ALTER TABLE servers ADD COLUMN project_id INTEGER DEFAULT NULL')
-        except sqlite3.OperationalError:
-            pass
-        
-        conn.commit()
+        mismatches = []
+        zero = (0, 0, 0, 0)
+        for k in set(actual) | set(stored):
+            a, st = actual.get(k, zero), stored.get(k, zero)
+            if a != st:
+                mismatches.append({'project_id': k or None, 'expected': dict(zip(fields, a)),
+                                   'stored': dict(zip(fields, st))})
+    
+    if mismatches and repair:
+        rebuild_project_stats()
+    
+    return {'consistent': not mismatches, 'mismatches': mismatches, 'repaired': bool(mismatches and repair)}
+
+
+# Hot queries that must not fall back to a full table scan
+HOT_QUERIES = [
+    ('SELECT * FROM servers WHERE project_id = ? ORDER BY id', (1,)),
+    ('SELECT * FROM servers WHERE project_id IS NULL ORDER BY id', ()),
+    ("SELECT COUNT(*) FROM servers WHERE status = 'Online' AND project_id = ?", (1,)),
+    ("SELECT COUNT(*) FROM servers WHERE status = 'Online'", ()),
+    ('SELECT MAX(last_scan) FROM servers', ()),
+    ('DELETE FROM servers WHERE project_id = ?', (1,)),
+    ('SELECT * FROM servers WHERE hostname = ?', ('x',)),
+    ('SELECT * FROM servers WHERE serial = ?', ('x',)),
+    ("SELECT project_id, COUNT(*), SUM(status = 'Online') FROM servers GROUP BY project_id", ()),
+    ('SELECT MAX(last_scan) FROM servers WHERE project_id = ?', (1,)),
+    ('SELECT MAX(last_scan) FROM servers WHERE project_id IS NULL', ()),
+]
+
+
+def check_query_plans():
+    # Run EXPLAIN QUERY PLAN on the hot queries - returns [(sql, uses_index, plan)]
+    out = []
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        for sql, params in HOT_QUERIES:
+            cur.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            plan = ' | '.join(r[3] for r in cur.fetchall())
+            full_scan = any(step.strip() == 'SCAN servers' for step in plan.split('|'))
+            out.append((sql, not full_scan and 'INDEX' in plan, plan))
+    return out
 
 
 def add_server(ip_addr, user, pwd, os_t, proj_id=None):
+    # Encrypt on the caller's thread - the writer only ever gets ciphertext
+    return _insert_server(ip_addr, user or '', encrypt_password(pwd or ''), os_t or 'Windows', proj_id)
+
+
+@writes
+def _insert_server(ip_addr, user, enc_pwd, os_t, proj_id):
     with get_db_connection() as conn:
         cur = conn.cursor()
         ts = datetime.now().isoformat()
-        
-        # Defaults
-        if not user:
-            user = ''
-        if not pwd:
-            pwd = ''
-        if not os_t:
-            os_t = 'Windows'
-        
-        # Encrypt the password
-        enc_pwd = encrypt_password(pwd)
-            
         try:
             cur.execute('''
                 INSERT INTO servers (ip, username, password, os_type, status, created_at, updated_at, project_id)
                 VALUES (?, ?, ?, ?, 'Not Scanned', ?, ?, ?)
             ''', (ip_addr, user, enc_pwd, os_t, ts, ts, proj_id))
-            conn.commit()
             return {'success': True, 'id': cur.lastrowid}
         except sqlite3.IntegrityError:
             return {'success': False, 'error': 'Server with this IP already exists'}
 
 
-def get_all_servers():
-    # Get all servers, decrypt passwords
+# Every column of servers, in table order
+SERVER_COLUMNS = [
+    'id', 'ip', 'username', 'password', 'os_type', 'hostname', 'domain', 'brand', 'model',
+    'serial', 'motherboard', 'cpu_count', 'cpu_cores', 'cpu_logical_processors', 'cpu_model',
+    'ram_physical', 'ram_logical', 'disk_info', 'network_primary', 'network_all', 'os_version',
+    'service_pack', 'status', 'last_scan', 'created_at', 'updated_at', 'project_id',
+    'credential_profile_id'
+]
+
+# What listings/exports get by default - no ciphertext, nothing to decrypt
+LIST_COLUMNS = [c for c in SERVER_COLUMNS if c != 'password']
+
+# Just what the scan path needs to connect
+SCAN_COLUMNS = ['id', 'ip', 'username', 'password', 'os_type', 'credential_profile_id']
+
+
+def _query_servers(where='', params=(), columns=None, with_credentials=False):
+    # SELECT only the requested columns; passwords are only read (and decrypted) when asked for
+    cols = list(columns) if columns else list(LIST_COLUMNS)
+    bad = [c for c in cols if c not in SERVER_COLUMNS]
+    if bad:
+        raise ValueError(f'Unknown server columns: {bad}')
+    if with_credentials and 'password' not in cols:
+        cols.append('password')
+    elif not with_credentials and 'password' in cols:
+        cols.remove('password')
+    
     with get_db_connection() as conn:
         cur = conn.cursor()
-        cur.execute('SELECT * FROM servers ORDER BY id')
-        rows = cur.fetchall()
-        result = []
-        for r in rows:
-            srv = dict(r)
+        cur.execute(f"SELECT {', '.join(cols)} FROM servers {where} ORDER BY id", params)
+        result = [dict(r) for r in cur.fetchall()]
+    
+    if with_credentials:
+        for srv in result:
             if srv.get('password'):
                 srv['password'] = decrypt_password(srv['password'])
-            result.append(srv)
-        return result
+    return result
+
+
+def get_all_servers(columns=None, with_credentials=False):
+    return _query_servers('', (), columns, with_credentials)
+
+
+# Sort keys for paged listing - NULLs folded to '' / 0 so keyset comparisons stay simple
+SORT_KEYS = {
+    'id': None,
+    'hostname': "COALESCE(s.hostname, '') COLLATE NOCASE",
+    'ip': 's.ip',
+    'project_name': "COALESCE(p.name, '') COLLATE NOCASE",
+    'os_type': "COALESCE(s.os_type, '')",
+    'brand': "COALESCE(s.brand, '') COLLATE NOCASE",
+    'model': "COALESCE(s.model, '') COLLATE NOCASE",
+    'status': "COALESCE(s.status, '')",
+    'ram_logical': 'COALESCE(s.ram_logical, 0)',
+    'last_scan': "COALESCE(s.last_scan, '')",
+}
+
+def encode_cursor(key, srv_id):
+    raw = json.dumps([key, srv_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        key, srv_id = json.loads(raw)
+        return key, int(srv_id)
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+
+def _server_filters(project=None, status=None, os_type=None, search=None):
+    # WHERE clause + params shared by the page query and its COUNT
+    where, params = [], []
+    if project == 'unassigned':
+        where.append('s.project_id IS NULL')
+    elif project is not None:
+        where.append('s.project_id = ?')
+        params.append(int(project))
+    if status:
+        where.append('s.status = ?')
+        params.append(status)
+    if os_type:
+        where.append('s.os_type = ?')
+        params.append(os_type)
+    search = (search or '').strip()
+    if search:
+        # FTS only matches word prefixes - keep the old substring match on hostname/ip ('web' finds 'prodweb01')
+        like = '%' + search.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+        cond = ["s.hostname LIKE ? ESCAPE '\\'", "s.ip LIKE ? ESCAPE '\\'"]
+        args = [like, like]
+        match = fts_query(search)
+        if match:
+            cond.insert(0, 's.id IN (SELECT rowid FROM servers_fts WHERE servers_fts MATCH ?)')
+            args.insert(0, match)
+        where.append(f"({' OR '.join(cond)})")
+        params.extend(args)
+    return where, params
+
+
+@cached_read
+def get_servers_page(project=None, status=None, os_type=None, search=None,
+                     sort='hostname', direction='asc', limit=PAGE_SIZE_DEFAULT, cursor=None):
+    # One page of servers filtered/sorted in SQL, keyset pagination on (sort key, id); cursor = previous next_cursor
+    if sort not in SORT_KEYS:
+        raise ValueError(f'Unknown sort column: {sort}')
+    if direction not in ('asc', 'desc'):
+        raise ValueError(f'Unknown sort direction: {direction}')
+    limit = max(1, min(int(limit), PAGE_SIZE_MAX))
+    
+    where, params = _server_filters(project, status, os_type, search)
+    count_where = ' AND '.join(where)
+    count_params = list(params)
+    
+    key = SORT_KEYS[sort]
+    op = '>' if direction == 'asc' else '<'
+    if cursor:
+        last_key, last_id = decode_cursor(cursor)
+        if key is None:
+            where.append(f's.id {op} ?')
+            params.append(last_id)
+        else:
+            where.append(f'({key} {op} ? OR ({key} = ? AND s.id {op} ?))')
+            params.extend([last_key, last_key, last_id])
+    
+    order = f's.id {direction.upper()}'
+    if key is not None:
+        order = f'{key} {direction.upper()}, {order}'
+    sort_expr = key or 's.id'
+    cols = ', '.join(f's.{c}' for c in LIST_COLUMNS)
+    
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        # Total for the filter, independent of the page position
+        cur.execute(f"SELECT COUNT(*) FROM servers s {'WHERE ' + count_where if count_where else ''}", count_params)
+        total = cur.fetchone()[0]
+        
+        cur.execute(f'''
+            SELECT {cols}, COALESCE(p.name, '') AS project_name, {sort_expr} AS sort_key
+            FROM servers s LEFT JOIN projects p ON p.id = s.project_id
+            {'WHERE ' + ' AND '.join(where) if where else ''}
+            ORDER BY {order}
+            LIMIT ?
+        ''', params + [limit + 1])
+        rows = [dict(r) for r in cur.fetchall()]
+    
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]['sort_key'], rows[-1]['id'])
+    for r in rows:
+        del r['sort_key']
+    
+    return {'servers': rows, 'total': total, 'next_cursor': next_cursor, 'limit': limit}
 
 
 def get_server(srv_id):
@@ -162,155 +1188,455 @@ def get_server_by_ip(ip_addr):
         return None
 
 
+@writes
 def delete_server(srv_id):
     with get_db_connection() as conn:
         cur = conn.cursor()
         cur.execute('DELETE FROM servers WHERE id = ?', (srv_id,))
-        conn.commit()
         return cur.rowcount > 0
 
 
 def update_server_credentials(srv_id, user, pwd):
+    return _set_server_credentials(srv_id, user, encrypt_password(pwd))
+
+
+@writes
+def _set_server_credentials(srv_id, user, enc_pwd):
     with get_db_connection() as conn:
         cur = conn.cursor()
         ts = datetime.now().isoformat()
-        enc_pwd = encrypt_password(pwd)
-        cur.execute('UPDATE servers SET username = ?, password = ?, updated_at = ? WHERE id = ?',
+        # Own credentials replace the profile, so a server has exactly one source
+        cur.execute('UPDATE servers SET username = ?, password = ?, credential_profile_id = NULL, updated_at = ? WHERE id = ?',
                    (user, enc_pwd, ts, srv_id))
-        conn.commit()
         return cur.rowcount > 0
 
 
+@writes
 def clear_all_servers():
     with get_db_connection() as conn:
         cur = conn.cursor()
         cur.execute('DELETE FROM servers')
-        conn.commit()
         return cur.rowcount
 
 
+@writes
 def clear_servers_by_project(proj_id):
     with get_db_connection() as conn:
         cur = conn.cursor()
         cur.execute('DELETE FROM servers WHERE project_id = ?', (proj_id,))
-        conn.commit()
         return cur.rowcount
 
 
+@writes
 def clear_unassigned_servers():
     with get_db_connection() as conn:
         cur = conn.cursor()
         cur.execute('DELETE FROM servers WHERE project_id IS NULL')
-        conn.commit()
         return cur.rowcount
 
 
+@writes
 def clear_all_data():
     # Wipe everything - fresh start each session
     with get_db_connection() as conn:
         cur = conn.cursor()
         cur.execute('DELETE FROM servers')
         cur.execute('DELETE FROM projects')
+        cur.execute('DELETE FROM credential_profiles')
         # Reset counters
-        cur.execute("DELETE FROM sqlite_sequence WHERE name='servers'")
-        cur.execute("DELETE FROM sqlite_sequence WHERE name='projects'")
-        conn.commit()
+        cur.execute("DELETE FROM sqlite_sequence WHERE name IN ('servers', 'projects', 'credential_profiles')")
+
+
+SCAN_UPDATE_SQL = '''
+    UPDATE servers SET
+        hostname = ?, domain = ?, brand = ?, model = ?, serial = ?,
+        motherboard = ?, cpu_count = ?, cpu_cores = ?, cpu_logical_processors = ?,
+        cpu_model = ?, ram_physical = ?, ram_logical = ?, disk_info = ?,
+        network_primary = ?, network_all = ?, os_version = ?, service_pack = ?,
+        status = ?, last_scan = ?, updated_at = ?
+    WHERE id = ?
+'''
+
+STATUS_UPDATE_SQL = 'UPDATE servers SET status = ?, last_scan = ?, updated_at = ? WHERE id = ?'
+
+
+def _scan_params(srv_id, data, ts):
+    return (
+        data.get('hostname'), data.get('domain'), data.get('brand'), data.get('model'),
+        data.get('serial'), data.get('motherboard'), data.get('cpu_count'),
+        data.get('cpu_cores'), data.get('cpu_logical_processors'), data.get('cpu_model'),
+        data.get('ram_physical'), data.get('ram_logical'), data.get('disk_info'),
+        data.get('network_primary'), data.get('network_all'), data.get('os_version'),
+        data.get('service_pack'), data.get('status', 'Online'), ts, ts, srv_id
+    )
+
+
+# Fields tracked by scan_history (last_scan/updated_at change every time, so they're left out)
+HISTORY_FIELDS = [
+    'hostname', 'domain', 'brand', 'model', 'serial', 'motherboard', 'cpu_count',
+    'cpu_cores', 'cpu_logical_processors', 'cpu_model', 'ram_physical', 'ram_logical',
+    'disk_info', 'network_primary', 'network_all', 'os_version', 'service_pack', 'status'
+]
+
+
+def _encode_delta(delta):
+    return zlib.compress(json.dumps(delta, separators=(',', ':')).encode())
+
+
+def _decode_delta(blob):
+    return json.loads(zlib.decompress(blob))
+
 
+def record_history(cur, items, ts):
+    # Log a scan_history delta for each (srv_id, new_values) that differs from servers - run before the UPDATE
+    items = [(srv_id, new) for srv_id, new in items if new]
+    rows = []
+    for i in range(0, len(items), 500):
+        chunk = items[i:i + 500]
+        ids = [srv_id for srv_id, _ in chunk]
+        cur.execute(f"SELECT id, {', '.join(HISTORY_FIELDS)} FROM servers WHERE id IN ({', '.join('?' * len(ids))})", ids)
+        current = {r['id']: r for r in cur.fetchall()}
+        for srv_id, new in chunk:
+            old = current.get(srv_id)
+            if old is None:
+                continue
+            # str() compare so '2' vs 2 (column affinity) isn't a change
+            delta = {f: v for f, v in new.items()
+                     if old[f] != v and (old[f] is None or v is None or str(old[f]) != str(v))}
+            if delta:
+                rows.append((srv_id, ts, _encode_delta(delta)))
+    if rows:
+        cur.executemany('INSERT INTO scan_history (server_id, scanned_at, delta) VALUES (?, ?, ?)', rows)
+    return len(rows)
 
+
+def _history_values(data):
+    # What a full scan writes into the tracked fields (missing keys are written as NULL)
+    vals = {f: data.get(f) for f in HISTORY_FIELDS}
+    vals['status'] = data.get('status', 'Online')
+    return vals
+
+
+def get_server_history(srv_id, limit=200):
+    # Change entries, newest first: [{'scanned_at', 'changes': {field: new value}}]
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute('SELECT scanned_at, delta FROM scan_history WHERE server_id = ? '
+                    'ORDER BY scanned_at DESC, id DESC LIMIT ?', (srv_id, limit))
+        return [{'scanned_at': r['scanned_at'], 'changes': _decode_delta(r['delta'])} for r in cur.fetchall()]
+
+
+def get_server_state_at(srv_id, at):
+    # Replay a server's deltas up to `at`; None if it has no history by then
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute('SELECT scanned_at, delta FROM scan_history WHERE server_id = ? AND scanned_at <= ? '
+                    'ORDER BY scanned_at, id', (srv_id, at))
+        state = None
+        last = None
+        for r in cur:
+            if state is None:
+                state = dict.fromkeys(HISTORY_FIELDS)
+            state.update(_decode_delta(r['delta']))
+            last = r['scanned_at']
+    if state is None:
+        return None
+    return {'as_of': at, 'last_change': last, 'state': state}
+
+
+@writes
 def update_server_scan_data(srv_id, data):
     # Save scan results to DB
     with get_db_connection() as conn:
         cur = conn.cursor()
         ts = datetime.now().isoformat()
-        
-        cur.execute('''
-            UPDATE servers SET
-                hostname = ?, domain = ?, brand = ?, model = ?, serial = ?,
-                motherboard = ?, cpu_count = ?, cpu_cores = ?, cpu_logical_processors = ?,
-                cpu_model = ?, ram_physical = ?, ram_logical = ?, disk_info = ?,
-                network_primary = ?, network_all = ?, os_version = ?, service_pack = ?,
-                status = ?, last_scan = ?, updated_at = ?
-            WHERE id = ?
-        ''', (
-            data.get('hostname'), data.get('domain'), data.get('brand'), data.get('model'),
-            data.get('serial'), data.get('motherboard'), data.get('cpu_count'),
-            data.get('cpu_cores'), data.get('cpu_logical_processors'), data.get('cpu_model'),
-            data.get('ram_physical'), data.get('ram_logical'), data.get('disk_info'),
-            data.get('network_primary'), data.get('network_all'), data.get('os_version'),
-            data.get('service_pack'), data.get('status', 'Online'), ts, ts, srv_id
-        ))
-        conn.commit()
-        return cur.rowcount > 0
+        record_history(cur, [(srv_id, _history_values(data))], ts)
+        cur.execute(SCAN_UPDATE_SQL, _scan_params(srv_id, data, ts))
+        updated = cur.rowcount > 0
+        if updated:
+            save_hardware(cur, [(srv_id, data)])
+        return updated
 
 
+@writes
 def update_server_status(srv_id, stat):
     with get_db_connection() as conn:
         cur = conn.cursor()
         ts = datetime.now().isoformat()
-        cur.execute('UPDATE servers SET status = ?, last_scan = ?, updated_at = ? WHERE id = ?',
-                   (stat, ts, ts, srv_id))
-        conn.commit()
+        record_history(cur, [(srv_id, {'status': stat})], ts)
+        cur.execute(STATUS_UPDATE_SQL, (stat, ts, ts, srv_id))
         return cur.rowcount > 0
 
 
+@writes
+def save_scan_results(results):
+    # Persist a batch of scan results in one transaction
+    # Online -> full scan data, alias of a scanned box -> just marked Online, anything else -> just marked Offline
+    ts = datetime.now().isoformat()
+    online = []
+    status_only = []
+    hw = []
+    hist = []
+    for res in results:
+        srv_id = res.get('id')
+        if not srv_id:
+            continue
+        if res.get('alias_of'):
+            # Answered through another IP of the same box - only the status is ours to record
+            status_only.append(('Online', ts, ts, srv_id))
+            hist.append((srv_id, {'status': 'Online'}))
+        elif res.get('status') == 'Online':
+            online.append(_scan_params(srv_id, res, ts))
+            hw.append((srv_id, res))
+            hist.append((srv_id, _history_values(res)))
+        else:
+            status_only.append(('Offline', ts, ts, srv_id))
+            hist.append((srv_id, {'status': 'Offline'}))
+    
+    if online or status_only:
+        with get_db_connection() as conn:
+            record_history(conn.cursor(), hist, ts)
+            if online:
+                conn.executemany(SCAN_UPDATE_SQL, online)
+                # Offline hosts keep their last-known hardware, like the legacy columns
+                save_hardware(conn.cursor(), hw)
+            if status_only:
+                conn.executemany(STATUS_UPDATE_SQL, status_only)
+    return {'online': len(online), 'offline': sum(1 for row in status_only if row[0] == 'Offline')}
+
+
+class ScanResultBatcher:
+    # Micro-batches results coming from a streaming scan:
+    # flushes every `size` results or `interval` seconds, whichever comes first
+    
+    def __init__(self, size=100, interval=2.0):
+        self.size = size
+        self.interval = interval
+        self.pending = []
+        self.saved = 0
+        self.last_flush = time.monotonic()
+    
+    def add(self, res):
+        self.pending.append(res)
+        if len(self.pending) >= self.size or time.monotonic() - self.last_flush >= self.interval:
+            self.flush()
+    
+    def flush(self):
+        if self.pending:
+            save_scan_results(self.pending)
+            self.saved += len(self.pending)
+            self.pending = []
+        self.last_flush = time.monotonic()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        # Save what we have even if the scan loop blew up
+        self.flush()
+        return False
+
+
+def _existing_ips(cur, ips):
+    # Which of these IPs are already in the DB (chunked to stay under SQLite's variable limit)
+    found = set()
+    ips = list(ips)
+    for i in range(0, len(ips), 500):
+        chunk = ips[i:i + 500]
+        cur.execute(f"SELECT ip FROM servers WHERE ip IN ({','.join('?' * len(chunk))})", chunk)
+        found.update(r[0] for r in cur.fetchall())
+    return found
+
+
 def bulk_add_servers(srv_list, proj_id=None):
-    # Add multiple servers
+    # Add multiple servers - one transaction, duplicates reported per row like add_server does
     res = {'success': 0, 'failed': 0, 'errors': []}
+    ts = datetime.now().isoformat()
+    
+    # Encrypt here, on the caller's thread - the writer transaction only gets ciphertext
+    rows = []
     for srv in srv_list:
-        r = add_server(srv.get('ip'), srv.get('username'), srv.get('password'),
-                      srv.get('os_type', 'Windows'), proj_id)
-        if r['success']:
-            res['success'] += 1
-        else:
+        ip_addr = srv.get('ip')
+        if not ip_addr:
             res['failed'] += 1
-            res['errors'].append({'ip': srv.get('ip'), 'error': r['error']})
+            res['errors'].append({'ip': ip_addr, 'error': 'Missing IP'})
+            continue
+        rows.append((ip_addr, srv.get('username') or '', encrypt_password(srv.get('password') or ''),
+                     srv.get('os_type') or 'Windows', ts, ts, proj_id))
+    
+    if not rows:
+        return res
+    return _insert_server_rows(rows, ts, res)
+
+
+@writes
+def _insert_server_rows(rows, ts, res):
+    # rows: (ip, username, encrypted password, os_type, created_at, updated_at, project_id)
+    dup_err = 'Server with this IP already exists'
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        existing = _existing_ips(cur, {r[0] for r in rows})
+        
+        to_insert = []
+        for r in rows:
+            if r[0] in existing:
+                res['failed'] += 1
+                res['errors'].append({'ip': r[0], 'error': dup_err})
+            else:
+                existing.add(r[0])  # catches duplicates inside the list too
+                to_insert.append(r)
+        
+        cur.executemany('''
+            INSERT INTO servers (ip, username, password, os_type, status, created_at, updated_at, project_id)
+            VALUES (?, ?, ?, ?, 'Not Scanned', ?, ?, ?)
+            ON CONFLICT(ip) DO NOTHING
+        ''', to_insert)
+        
+        inserted = cur.rowcount if cur.rowcount >= 0 else len(to_insert)
+        if inserted < len(to_insert):
+            # Someone else inserted some of these in the meantime - find out which
+            cur.execute('SELECT ip FROM servers WHERE created_at = ?', (ts,))
+            mine = {r[0] for r in cur.fetchall()}
+            inserted = 0
+            for r in to_insert:
+                if r[0] in mine:
+                    inserted += 1
+                else:
+                    res['failed'] += 1
+                    res['errors'].append({'ip': r[0], 'error': dup_err})
+        res['success'] += inserted
+    
     return res
 
 
+# Counts by status in one pass - conditional sums instead of one COUNT query per status
+STATS_COLS = '''
+    COUNT(*) AS total,
+    COALESCE(SUM(status = 'Online'), 0) AS online,
+    COALESCE(SUM(status = 'Offline'), 0) AS offline,
+    COALESCE(SUM(status = 'Not Scanned'), 0) AS not_scanned,
+    MAX(last_scan) AS last_scan
+'''
+
+
+def _stats_dict(r):
+    if r is None:
+        return {'total': 0, 'online': 0, 'offline': 0, 'not_scanned': 0, 'last_scan': None}
+    return {'total': r['total'] or 0, 'online': r['online'] or 0, 'offline': r['offline'] or 0,
+            'not_scanned': r['not_scanned'] or 0,
+            'last_scan': r['last_scan'] if 'last_scan' in r.keys() else None}
+
+
+def _last_scan(cur, proj_key):
+    # MAX via the (project_id, last_scan) index - a single index seek
+    if proj_key is None:
+        cur.execute('SELECT MAX(last_scan) FROM servers')
+    elif proj_key == 0:
+        cur.execute('SELECT MAX(last_scan) FROM servers WHERE project_id IS NULL')
+    else:
+        cur.execute('SELECT MAX(last_scan) FROM servers WHERE project_id = ?', (proj_key,))
+    return cur.fetchone()[0]
+
+
+@cached_read
 def get_server_stats(proj_id=None):
+    # Counts come from project_stats, so this doesn't depend on fleet size
     with get_db_connection() as conn:
         cur = conn.cursor()
-        
         if proj_id is not None:
-            cur.execute('SELECT COUNT(*) as total FROM servers WHERE project_id = ?', (proj_id,))
-            total = cur.fetchone()['total']
-            cur.execute("SELECT COUNT(*) as online FROM servers WHERE status = 'Online' AND project_id = ?", (proj_id,))
-            online = cur.fetchone()['online']
-            cur.execute("SELECT COUNT(*) as offline FROM servers WHERE status = 'Offline' AND project_id = ?", (proj_id,))
-            offline = cur.fetchone()['offline']
-            cur.execute("SELECT COUNT(*) as not_scanned FROM servers WHERE status = 'Not Scanned' AND project_id = ?", (proj_id,))
-            not_scanned = cur.fetchone()['not_scanned']
-            cur.execute('SELECT MAX(last_scan) as last_scan FROM servers WHERE project_id = ?', (proj_id,))
-            last_scan = cur.fetchone()['last_scan']
+            cur.execute('SELECT * FROM project_stats WHERE project_key = ?', (proj_id,))
+            stats = _stats_dict(cur.fetchone())
         else:
-            cur.execute('SELECT COUNT(*) as total FROM servers')
-            total = cur.fetchone()['total']
-            cur.execute("SELECT COUNT(*) as online FROM servers WHERE status = 'Online'")
-            online = cur.fetchone()['online']
-            cur.execute("SELECT COUNT(*) as offline FROM servers WHERE status = 'Offline'")
-            offline = cur.fetchone()['offline']
-            cur.execute("SELECT COUNT(*) as not_scanned FROM servers WHERE status = 'Not Scanned'")
-            not_scanned = cur.fetchone()['not_scanned']
-            cur.execute('SELECT MAX(last_scan) as last_scan FROM servers')
-            last_scan = cur.fetchone()['last_scan']
-        
-        return {'total': total, 'online': online, 'offline': offline, 'not_scanned': not_scanned, 'last_scan': last_scan}
+            cur.execute('''SELECT SUM(total) AS total, SUM(online) AS online, SUM(offline) AS offline,
+                                  SUM(not_scanned) AS not_scanned FROM project_stats''')
+            r = cur.fetchone()
+            stats = {'total': r['total'] or 0, 'online': r['online'] or 0, 'offline': r['offline'] or 0,
+                     'not_scanned': r['not_scanned'] or 0}
+        stats['last_scan'] = _last_scan(cur, proj_id)
+        return stats
+
+
+@cached_read
+def get_stats_by_project():
+    # {project_id (None = unassigned): stats} for every project that has servers
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute('SELECT * FROM project_stats WHERE total > 0')
+        out = {}
+        for r in cur.fetchall():
+            st = _stats_dict(r)
+            st['last_scan'] = _last_scan(cur, r['project_key'])
+            out[r['project_key'] or None] = st
+        return out
+
+
+# Negative discovery cache
+# Not wiped by clear_all_data - it holds no credentials and is only useful across sessions
+
+@writes
+def mark_ips_dead(ip_nums):
+    if not ip_nums:
+        return 0
+    with get_db_connection() as conn:
+        ts = datetime.now().isoformat()
+        conn.executemany('INSERT OR REPLACE INTO discovery_cache (ip_num, checked_at) VALUES (?, ?)',
+                         [(n, ts) for n in ip_nums])
+        return len(ip_nums)
+
+
+@writes
+def unmark_ips_dead(ip_nums):
+    if not ip_nums:
+        return 0
+    with get_db_connection() as conn:
+        conn.executemany('DELETE FROM discovery_cache WHERE ip_num = ?', [(n,) for n in ip_nums])
+        return len(ip_nums)
+
+
+def get_dead_intervals(intervals, ttl_secs):
+    # Cached dead IPs inside the given (start, end) intervals, collapsed into runs
+    cutoff = (datetime.now() - timedelta(seconds=ttl_secs)).isoformat()
+    runs = []
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        for a, b in intervals:
+            cur.execute('SELECT ip_num FROM discovery_cache WHERE ip_num BETWEEN ? AND ? AND checked_at >= ? ORDER BY ip_num',
+                       (a, b, cutoff))
+            for (n,) in cur:
+                if runs and runs[-1][1] == n - 1:
+                    runs[-1][1] = n
+                else:
+                    runs.append([n, n])
+    return [tuple(r) for r in runs]
+
+
+@writes
+def clear_discovery_cache(older_than_secs=None):
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        if older_than_secs is None:
+            cur.execute('DELETE FROM discovery_cache')
+        else:
+            cutoff = (datetime.now() - timedelta(seconds=older_than_secs)).isoformat()
+            cur.execute('DELETE FROM discovery_cache WHERE checked_at < ?', (cutoff,))
+        return cur.rowcount
 
 
 # Project functions
 
+@writes
 def create_project(proj_name):
     with get_db_connection() as conn:
         cur = conn.cursor()
         ts = datetime.now().isoformat()
         try:
             cur.execute('INSERT INTO projects (name, created_at) VALUES (?, ?)', (proj_name, ts))
-            conn.commit()
             return {'success': True, 'id': cur.lastrowid}
         except sqlite3.IntegrityError:
             return {'success': False, 'error': 'Project with this name already exists'}
 
 
+@cached_read
 def get_all_projects():
     with get_db_connection() as conn:
         cur = conn.cursor()
@@ -334,57 +1660,75 @@ def get_project_by_name(proj_name):
         return dict(r) if r else None
 
 
+@writes
 def delete_project(proj_id):
     with get_db_connection() as conn:
         cur = conn.cursor()
         cur.execute('UPDATE servers SET project_id = NULL WHERE project_id = ?', (proj_id,))
         cur.execute('DELETE FROM projects WHERE id = ?', (proj_id,))
-        conn.commit()
         return cur.rowcount > 0
 
 
+@writes
 def rename_project(proj_id, new_name):
     with get_db_connection() as conn:
         cur = conn.cursor()
         try:
             cur.execute('UPDATE projects SET name = ? WHERE id = ?', (new_name, proj_id))
-            conn.commit()
             return {'success': True}
         except sqlite3.IntegrityError:
             return {'success': False, 'error': 'Project with this name already exists'}
 
 
-def get_servers_by_project(proj_id):
-    with get_db_connection() as conn:
-        cur = conn.cursor()
-        if proj_id is None:
-            cur.execute('SELECT * FROM servers WHERE project_id IS NULL ORDER BY id')
-        else:
-            cur.execute('SELECT * FROM servers WHERE project_id = ? ORDER BY id', (proj_id,))
-        rows = cur.fetchall()
-        result = []
-        for r in rows:
-            srv = dict(r)
-            if srv.get('password'):
-                srv['password'] = decrypt_password(srv['password'])
-            result.append(srv)
-        return result
+@cached_read
+def get_servers_by_project(proj_id, columns=None, with_credentials=False):
+    if proj_id is None:
+        return _query_servers('WHERE project_id IS NULL', (), columns, with_credentials)
+    return _query_servers('WHERE project_id = ?', (proj_id,), columns, with_credentials)
+
+
+@cached_read
+def get_unassigned_servers(columns=None, with_credentials=False):
+    return _query_servers('WHERE project_id IS NULL', (), columns, with_credentials)
+
 
+def get_servers_to_scan(project=None, max_age=None, only_status=None, changed_since=None,
+                        columns=None, with_credentials=False):
+    # What a scan-all should touch, picked in SQL; max_age in seconds, changed_since ISO time
+    scope, params = [], []
+    if project == 'unassigned':
+        scope.append('project_id IS NULL')
+    elif project is not None:
+        scope.append('project_id = ?')
+        params.append(int(project))
 
-def get_unassigned_servers():
+    policy, pparams = [], []
+    if only_status:
+        policy.append(f"status IN ({', '.join('?' * len(only_status))})")
+        pparams.extend(only_status)
+    if changed_since:
+        policy.append('updated_at > ?')
+        pparams.append(changed_since)
+    fresh = None
+    if max_age is not None:
+        cutoff = (datetime.now() - timedelta(seconds=max_age)).isoformat()
+        fresh = ("status = 'Online' AND last_scan >= ?", [cutoff])
+
+    where = ' AND '.join(scope + policy + ([f'NOT ({fresh[0]})'] if fresh else []))
+    servers = _query_servers(f'WHERE {where}' if where else '', params + pparams + (fresh[1] if fresh else []),
+                             columns, with_credentials)
+    if not fresh:
+        return servers, 0
+
+    # skipped = only what max_age left out, not rows only_status / changed_since filtered away
     with get_db_connection() as conn:
         cur = conn.cursor()
-        cur.execute('SELECT * FROM servers WHERE project_id IS NULL ORDER BY id')
-        rows = cur.fetchall()
-        result = []
-        for r in rows:
-            srv = dict(r)
-            if srv.get('password'):
-                srv['password'] = decrypt_password(srv['password'])
-            result.append(srv)
-        return result
+        cur.execute(f"SELECT COUNT(*) FROM servers WHERE {' AND '.join(scope + policy + [fresh[0]])}",
+                    params + pparams + fresh[1])
+        return servers, cur.fetchone()[0]
 
 
+@writes
 def assign_servers_to_project(srv_ids, proj_id):
     with get_db_connection() as conn:
         cur = conn.cursor()
@@ -392,40 +1736,221 @@ def assign_servers_to_project(srv_ids, proj_id):
         for srv_id in srv_ids:
             cur.execute('UPDATE servers SET project_id = ?, updated_at = ? WHERE id = ?',
                        (proj_id, ts, srv_id))
-        conn.commit()
         return {'success': True, 'updated': len(srv_ids)}
 
 
+@cached_read
 def get_all_projects_with_stats():
-    projs = get_all_projects()
+    # Every project plus the unassigned bucket - O(projects) thanks to project_stats
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute('''
+            SELECT p.id, p.name, p.created_at, ps.total, ps.online, ps.offline, ps.not_scanned,
+                   (SELECT MAX(last_scan) FROM servers WHERE project_id = p.id) AS last_scan
+            FROM projects p LEFT JOIN project_stats ps ON ps.project_key = p.id
+            UNION ALL
+            SELECT NULL, NULL, NULL, ps.total, ps.online, ps.offline, ps.not_scanned,
+                   (SELECT MAX(last_scan) FROM servers WHERE project_id IS NULL)
+            FROM (SELECT 0 AS k) u LEFT JOIN project_stats ps ON ps.project_key = u.k
+        ''')
+        rows = cur.fetchall()
+    
     result = []
-    for p in projs:
-        stats = get_server_stats(p['id'])
-        p['stats'] = stats
-        result.append(p)
-    return {'projects': result, 'unassigned': get_server_stats_unassigned()}
+    unassigned = None
+    for r in rows:
+        if r['id'] is None:
+            unassigned = _stats_dict(r)
+        else:
+            result.append({'id': r['id'], 'name': r['name'], 'created_at': r['created_at'], 'stats': _stats_dict(r)})
+    result.sort(key=lambda p: p['name'])
+    return {'projects': result, 'unassigned': unassigned or _stats_dict(None)}
 
 
+@cached_read
 def get_server_stats_unassigned():
     with get_db_connection() as conn:
         cur = conn.cursor()
-        cur.execute('SELECT COUNT(*) as total FROM servers WHERE project_id IS NULL')
-        total = cur.fetchone()['total']
-        cur.execute("SELECT COUNT(*) as online FROM servers WHERE status = 'Online' AND project_id IS NULL")
-        online = cur.fetchone()['online']
-        cur.execute("SELECT COUNT(*) as offline FROM servers WHERE status = 'Offline' AND project_id IS NULL")
-        offline = cur.fetchone()['offline']
-        cur.execute("SELECT COUNT(*) as not_scanned FROM servers WHERE status = 'Not Scanned' AND project_id IS NULL")
-        not_scanned = cur.fetchone()['not_scanned']
-        cur.execute('SELECT MAX(last_scan) as last_scan FROM servers WHERE project_id IS NULL')
-        last_scan = cur.fetchone()['last_scan']
-        return {'total': total, 'online': online, 'offline': offline, 'not_scanned': not_scanned, 'last_scan': last_scan}
+        cur.execute('SELECT * FROM project_stats WHERE project_key = 0')
+        stats = _stats_dict(cur.fetchone())
+        stats['last_scan'] = _last_scan(cur, 0)
+        return stats
+
+
+# Credential profiles
+
+def create_credential_profile(name, user, pwd):
+    return _insert_credential_profile(name, user or '', encrypt_password(pwd))
+
+
+@writes
+def _insert_credential_profile(name, user, enc_pwd):
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        ts = datetime.now().isoformat()
+        try:
+            cur.execute('''
+                INSERT INTO credential_profiles (name, username, password, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (name, user, enc_pwd, ts, ts))
+            return {'success': True, 'id': cur.lastrowid}
+        except sqlite3.IntegrityError:
+            return {'success': False, 'error': 'Credential profile with this name already exists'}
+
+
+def update_credential_profile(profile_id, name=None, user=None, pwd=None):
+    # One row change, however many servers use the profile. None = keep the current value
+    return _update_credential_profile(profile_id, name, user, encrypt_password(pwd) if pwd is not None else None)
+
+
+@writes
+def _update_credential_profile(profile_id, name, user, enc_pwd):
+    sets, params = ['updated_at = ?'], [datetime.now().isoformat()]
+    if name is not None:
+        sets.append('name = ?')
+        params.append(name)
+    if user is not None:
+        sets.append('username = ?')
+        params.append(user)
+    if enc_pwd is not None:
+        sets.append('password = ?')
+        params.append(enc_pwd)
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute(f"UPDATE credential_profiles SET {', '.join(sets)} WHERE id = ?", params + [profile_id])
+        except sqlite3.IntegrityError:
+            return {'success': False, 'error': 'Credential profile with this name already exists'}
+        if cur.rowcount == 0:
+            return {'success': False, 'error': 'Credential profile not found'}
+        return {'success': True}
+
+
+@writes
+def delete_credential_profile(profile_id):
+    # Servers using it fall back to the default credentials (trigger clears the reference)
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute('DELETE FROM credential_profiles WHERE id = ?', (profile_id,))
+        return cur.rowcount > 0
+
+
+def get_credential_profiles():
+    # Profiles without secrets, with how many servers use each
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute('''
+            SELECT cp.id, cp.name, cp.username, cp.password != '' AS has_password,
+                   cp.created_at, cp.updated_at,
+                   (SELECT COUNT(*) FROM servers s WHERE s.credential_profile_id = cp.id) AS servers
+            FROM credential_profiles cp
+            ORDER BY cp.name
+        ''')
+        return [dict(r, has_password=bool(r['has_password'])) for r in cur.fetchall()]
+
+
+def get_credential_profile_secrets(profile_ids=None):
+    # {id: (username, password)}, each decrypted once - callers keep this for a whole scan batch
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        if profile_ids is None:
+            cur.execute('SELECT id, username, password FROM credential_profiles')
+        else:
+            cur.execute('SELECT id, username, password FROM credential_profiles '
+                        'WHERE id IN (SELECT value FROM json_each(?))', (json.dumps(list(profile_ids)),))
+        rows = cur.fetchall()
+    return {r['id']: (r['username'], decrypt_password(r['password'])) for r in rows}
+
+
+@writes
+def assign_credential_profile(profile_id, server_ids=None, project=None, subnet=None):
+    # Point servers (by ids / project / subnet, ANDed) at a profile, or None to go back - drops their own credentials
+    where, params = [], []
+    if server_ids is not None:
+        where.append('id IN (SELECT value FROM json_each(?))')
+        params.append(json.dumps([int(i) for i in server_ids]))
+    if project == 'unassigned':
+        where.append('project_id IS NULL')
+    elif project is not None:
+        where.append('project_id = ?')
+        params.append(int(project))
+    if subnet:
+        lo, hi = parse_range(subnet, hosts_only=False)
+        where.append('ip_num(ip) BETWEEN ? AND ?')
+        params += [lo, hi]
+    if not where:
+        raise ValueError('Select servers by server_ids, project_id or subnet')
+    where = ' AND '.join(where)
+
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        ts = datetime.now().isoformat()
+        if profile_id is None:
+            cur.execute(f'UPDATE servers SET credential_profile_id = NULL, updated_at = ? WHERE {where}',
+                        [ts] + params)
+            return {'success': True, 'updated': cur.rowcount}
+        cur.execute('SELECT 1 FROM credential_profiles WHERE id = ?', (profile_id,))
+        if not cur.fetchone():
+            return {'success': False, 'error': 'Credential profile not found'}
+        cur.execute(f"UPDATE servers SET credential_profile_id = ?, username = '', password = '', "
+                    f"updated_at = ? WHERE {where}", [profile_id, ts] + params)
+        return {'success': True, 'updated': cur.rowcount}
+
+
+def consolidate_credentials():
+    # One-off: each distinct (username, password) on servers becomes a profile those servers point at
+    # Crypto happens here on a read connection; the writer just applies the result
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT id, username, password FROM servers WHERE username != '' AND password != ''")
+        groups = {}
+        for r in cur.fetchall():
+            pwd = decrypt_password(r['password'])
+            if pwd:
+                groups.setdefault((r['username'], pwd), []).append((r['id'], r['password']))
+    
+    profiles = [(user, encrypt_password(pwd), rows) for (user, pwd), rows in groups.items()]
+    return _apply_consolidation(profiles)
+
+
+@writes
+def _apply_consolidation(profiles):
+    # profiles: [(username, encrypted password, [(server id, ciphertext it had when read)])]
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute('SELECT name FROM credential_profiles')
+        names = {r['name'] for r in cur.fetchall()}
+        ts = datetime.now().isoformat()
+        updated = 0
+        for user, enc_pwd, rows in profiles:
+            name, n = user, 1
+            while name in names:
+                n += 1
+                name = f'{user} ({n})'
+            names.add(name)
+            cur.execute('''
+                INSERT INTO credential_profiles (name, username, password, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (name, user, enc_pwd, ts, ts))
+            profile_id = cur.lastrowid
+            # Rows whose credentials changed since they were read keep the new ones
+            cur.executemany("UPDATE servers SET credential_profile_id = ?, username = '', password = '', "
+                            "updated_at = ? WHERE id = ? AND username = ? AND password = ?",
+                            [(profile_id, ts, srv_id, user, old) for srv_id, old in rows])
+            updated += cur.rowcount
+        return {'profiles_created': len(profiles), 'servers_updated': updated}
 
 
 # Initialize database on module import
+if is_memory_db():
+    start_memory_db()
 init_db()
 
-# Clear all data on startup - data is temporary, only for current session
+# Session mode (default): clear all data on startup - data is temporary, only for current session
 # Data is used temporarily during scanning and Excel export, then cleared on exit
-clear_all_data()
+# Persistent mode keeps the last-known inventory across restarts
+if PERSISTENT_MODE:
+    logging.info(f"Persistent mode: keeping inventory in {DB_PATH}")
+else:
+    clear_all_data()
 
+mark_snapshot_clean()
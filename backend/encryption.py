@@ -265,51 +265,64 @@ def rotate_encryption_key(callback_progress=None):
         new_fernet = Fernet(new_key)
         
         # Import database functions here to avoid circular imports
-        from database import get_db_connection
+        from database import get_db_connection, run_write
         
-        servers_updated = 0
-        servers_failed = 0
-        total_servers = 0
-        
-        # Get all servers with encrypted passwords
-        with get_db_connection() as conn:
-            cur = conn.cursor()
-            cur.execute('SELECT id, password FROM servers WHERE password != "" AND password IS NOT NULL')
-            servers = cur.fetchall()
-            total_servers = len(servers)
+        # Runs on the DB writer thread - one transaction for all re-encrypted passwords
+        def reencrypt_all():
+            servers_updated = 0
+            servers_failed = 0
+            total_servers = 0
+            
+            # Get all servers with encrypted passwords
+            with get_db_connection() as conn:
+                cur = conn.cursor()
+                cur.execute('SELECT id, password FROM servers WHERE password != "" AND password IS NOT NULL')
+                servers = cur.fetchall()
+                total_servers = len(servers)
             
-            if callback_progress:
-                callback_progress(0, total_servers, None)
+                if callback_progress:
+                    callback_progress(0, total_servers, None)
             
-            # Re-encrypt each password
-            for idx, server in enumerate(servers):
-                server_id = server['id']
-                old_enc_pwd = server['password']
+                # Re-encrypt each password
+                for idx, server in enumerate(servers):
+                    server_id = server['id']
+                    old_enc_pwd = server['password']
                 
-                try:
-                    # Decrypt with old key
-                    plain_pwd = decrypt_with_key(old_enc_pwd, old_key)
+                    try:
+                        # Decrypt with old key
+                        plain_pwd = decrypt_with_key(old_enc_pwd, old_key)
                     
-                    if plain_pwd:
-                        # Encrypt with new key
-                        new_enc_pwd = encrypt_with_key(plain_pwd, new_key)
+                        if plain_pwd:
+                            # Encrypt with new key
+                            new_enc_pwd = encrypt_with_key(plain_pwd, new_key)
                         
-                        # Update in database
-                        cur.execute('UPDATE servers SET password = ? WHERE id = ?', (new_enc_pwd, server_id))
-                        servers_updated += 1
-                    else:
-                        logging.warning(f"Failed to decrypt password for server {server_id}, skipping")
-                        servers_failed += 1
+                            # Update in database
+                            cur.execute('UPDATE servers SET password = ? WHERE id = ?', (new_enc_pwd, server_id))
+                            servers_updated += 1
+                        else:
+                            logging.warning(f"Failed to decrypt password for server {server_id}, skipping")
+                            servers_failed += 1
                     
-                    if callback_progress:
-                        callback_progress(idx + 1, total_servers, server_id)
+                        if callback_progress:
+                            callback_progress(idx + 1, total_servers, server_id)
                         
-                except Exception as e:
-                    logging.error(f"Failed to re-encrypt password for server {server_id}: {e}")
-                    servers_failed += 1
-                    continue
-            
-            conn.commit()
+                    except Exception as e:
+                        logging.error(f"Failed to re-encrypt password for server {server_id}: {e}")
+                        servers_failed += 1
+                        continue
+
+                # Shared credential profiles, same transaction
+                cur.execute('SELECT id, password FROM credential_profiles WHERE password != ""')
+                for profile in cur.fetchall():
+                    plain_pwd = decrypt_with_key(profile['password'], old_key)
+                    if plain_pwd:
+                        cur.execute('UPDATE credential_profiles SET password = ? WHERE id = ?',
+                                    (encrypt_with_key(plain_pwd, new_key), profile['id']))
+                    else:
+                        logging.warning(f"Failed to decrypt password for credential profile {profile['id']}, skipping")
+            return total_servers, servers_updated, servers_failed
+
+        total_servers, servers_updated, servers_failed = run_write(reencrypt_all)
         
         # Backup old key (optional - for recovery if needed)
         try:
@@ -15,6 +15,14 @@ from datetime import datetime
 # Export directory
 EXPORT_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'exports')
 
+# Server fields the reports actually read - used to project the DB query
+EXPORT_COLUMNS = [
+    'id', 'hostname', 'ip', 'domain', 'os_type', 'brand', 'model', 'serial',
+    'motherboard', 'cpu_count', 'cpu_cores', 'cpu_logical_processors', 'cpu_model',
+    'ram_physical', 'ram_logical', 'disk_info', 'network_primary',
+    'os_version', 'service_pack', 'status', 'last_scan'
+]
+
 
 def ensure_export_directory():
     """Ensure the exports directory exists"""
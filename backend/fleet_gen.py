@@ -0,0 +1,225 @@
+# Synthetic fleet generator - fills the DB with fake servers for perf testing
+# Usage: python fleet_gen.py 100000 --projects 200
+
+import os
+import sys
+import json
+import random
+import sqlite3
+import argparse
+import ipaddress
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+BRANDS = {
+    'Dell Inc.': ['PowerEdge R740', 'PowerEdge R640', 'PowerEdge R750', 'PowerEdge R730xd'],
+    'HPE': ['ProLiant DL380 Gen10', 'ProLiant DL360 Gen10', 'ProLiant DL380 Gen9'],
+    'Lenovo': ['ThinkSystem SR650', 'ThinkSystem SR630'],
+    'VMware, Inc.': ['VMware Virtual Platform', 'VMware7,1'],
+}
+
+CPUS = [
+    'Intel(R) Xeon(R) Gold 6248R CPU @ 3.00GHz',
+    'Intel(R) Xeon(R) Silver 4214 CPU @ 2.20GHz',
+    'Intel(R) Xeon(R) CPU E5-2680 v4 @ 2.40GHz',
+    'AMD EPYC 7402 24-Core Processor',
+]
+
+WIN_OS = [
+    ('Microsoft Windows Server 2019 Standard', 'N/A'),
+    ('Microsoft Windows Server 2016 Datacenter', 'N/A'),
+    ('Microsoft Windows Server 2012 R2 Standard', 'N/A'),
+    ('Microsoft Windows Server 2008 R2 Enterprise', 'Service Pack 1'),
+]
+
+LINUX_OS = [
+    'Red Hat Enterprise Linux 8.6 (Ootpa)',
+    'Rocky Linux 9.2 (Blue Onyx)',
+    'Ubuntu 22.04.3 LTS',
+    'CentOS Linux 7 (Core)',
+]
+
+DISK_MODELS = ['PERC H740P Mini', 'LOGICAL VOLUME', 'Virtual disk', 'SAMSUNG MZ7LH960']
+
+# Roughly what a real sweep looks like
+STATUS_WEIGHTS = [('Online', 70), ('Offline', 15), ('Not Scanned', 15)]
+
+
+def _mac(rnd):
+    return ':'.join(f'{rnd.randint(0, 255):02X}' for _ in range(6))
+
+
+def _network(rnd, ip, windows):
+    # Primary NIC on the server IP, sometimes a backup/mgmt NIC too
+    base = ip.rsplit('.', 1)[0]
+    nics = [{'IP': ip, 'Subnet': '255.255.255.0' if windows else '24',
+             'Gateway': f'{base}.1', 'MAC': _mac(rnd)}]
+    for _ in range(rnd.choice([0, 0, 1, 2])):
+        extra = f'172.{rnd.randint(16, 31)}.{rnd.randint(0, 255)}.{rnd.randint(2, 254)}'
+        nics.append({'IP': extra, 'Subnet': '255.255.0.0' if windows else '16',
+                     'Gateway': '', 'MAC': _mac(rnd)})
+    p = nics[0]
+    primary = f"IP: {p['IP']} | Subnet: {p['Subnet']} | Gateway: {p['Gateway']} | MAC: {p['MAC']}"
+    return primary, json.dumps(nics)
+
+
+def _disks(rnd, windows):
+    parts = []
+    for i in range(rnd.randint(1, 4)):
+        size = rnd.choice([240, 480, 960, 1200, 1920, 3840])
+        model = rnd.choice(DISK_MODELS)
+        if windows:
+            parts.append(f'Disk {i}: {model} - {size}GB')
+        else:
+            parts.append(f'sd{chr(97 + i)}: {model} - {size}G')
+    return '; '.join(parts)
+
+
+def make_server(rnd, idx, ip, proj_id, now, enc_pwds):
+    # Build one realistic servers row (dict keyed by column name)
+    windows = rnd.random() < 0.6
+    stat = rnd.choices([s for s, _ in STATUS_WEIGHTS], [w for _, w in STATUS_WEIGHTS])[0]
+    created = (now - timedelta(days=rnd.randint(0, 30))).isoformat()
+
+    row = {
+        'ip': ip,
+        'username': rnd.choice(['', '', 'administrator', 'root', 'svc_inventory']),
+        'password': rnd.choice(enc_pwds),
+        'os_type': 'Windows' if windows else 'Linux',
+        'status': stat,
+        'created_at': created,
+        'updated_at': created,
+        'project_id': proj_id,
+    }
+
+    if stat == 'Not Scanned':
+        return row
+
+    last = (now - timedelta(minutes=rnd.randint(1, 60 * 24 * 14))).isoformat()
+    row['last_scan'] = last
+    row['updated_at'] = last
+    if stat == 'Offline':
+        return row
+
+    brand = rnd.choice(list(BRANDS))
+    sockets = rnd.choice([1, 2, 2, 4])
+    cores = sockets * rnd.choice([8, 12, 16, 24])
+    ram_mod = rnd.choice([16, 32, 64])
+    ram_cnt = rnd.choice([2, 4, 8, 12])
+    prefix = 'WIN' if windows else 'lnx'
+    primary, nets = _network(rnd, ip, windows)
+
+    row.update({
+        'hostname': f'{prefix}-srv{idx:06d}',
+        'domain': rnd.choice(['corp.local', 'dmz.local', 'prod.example.com', 'WORKGROUP']),
+        'brand': brand,
+        'model': rnd.choice(BRANDS[brand]),
+        'serial': ''.join(rnd.choice('ABCDEFGHJKLMNPQRSTUVWXYZ0123456789') for _ in range(7)),
+        'motherboard': f'{brand} - 0{rnd.randint(100000, 999999)}',
+        'cpu_count': sockets,
+        'cpu_cores': str(cores),
+        'cpu_logical_processors': str(cores * 2),
+        'cpu_model': rnd.choice(CPUS),
+        'ram_physical': ' + '.join([f'{ram_mod}GB'] * ram_cnt),
+        'ram_logical': ram_mod * ram_cnt * 1024 - rnd.randint(0, 512),
+        'disk_info': _disks(rnd, windows),
+        'network_primary': primary,
+        'network_all': nets,
+    })
+    if windows:
+        row['os_version'], row['service_pack'] = rnd.choice(WIN_OS)
+    else:
+        row['os_version'], row['service_pack'] = rnd.choice(LINUX_OS), 'N/A'
+    return row
+
+
+COLUMNS = [
+    'ip', 'username', 'password', 'os_type', 'hostname', 'domain', 'brand', 'model',
+    'serial', 'motherboard', 'cpu_count', 'cpu_cores', 'cpu_logical_processors',
+    'cpu_model', 'ram_physical', 'ram_logical', 'disk_info', 'network_primary',
+    'network_all', 'os_version', 'service_pack', 'status', 'last_scan',
+    'created_at', 'updated_at', 'project_id'
+]
+
+
+def generate_fleet(count, num_projects=20, unassigned_ratio=0.1, seed=42,
+                   start_ip='10.0.0.1', db_path=None, batch=5000):
+    """
+    Fill the servers/projects tables with `count` synthetic servers.
+    Existing rows are left alone, so call clear_all_data() first for a clean run.
+    Returns dict with counts.
+    """
+    import database
+    from encryption import encrypt_password
+
+    rnd = random.Random(seed)
+    now = datetime.now()
+    path = db_path or database.DB_PATH
+
+    # Encrypting per row would dominate runtime - a small pool of real ciphertexts is enough
+    enc_pwds = [''] * 3 + [encrypt_password(f'P@ss{i}word!') for i in range(5)]
+
+    conn = sqlite3.connect(path, uri=True)
+    conn.row_factory = sqlite3.Row
+    try:
+        cur = conn.cursor()
+        proj_ids = []
+        ts = now.isoformat()
+        for i in range(num_projects):
+            cur.execute('INSERT OR IGNORE INTO projects (name, created_at) VALUES (?, ?)',
+                        (f'Project {i + 1:03d}', ts))
+            cur.execute('SELECT id FROM projects WHERE name = ?', (f'Project {i + 1:03d}',))
+            proj_ids.append(cur.fetchone()[0])
+
+        sql = (f"INSERT OR IGNORE INTO servers ({', '.join(COLUMNS)}) "
+               f"VALUES ({', '.join('?' * len(COLUMNS))})")
+        base = int(ipaddress.IPv4Address(start_ip))
+        rows = []
+        added = 0
+        for idx in range(count):
+            ip = str(ipaddress.IPv4Address(base + idx))
+            if proj_ids and rnd.random() >= unassigned_ratio:
+                proj = rnd.choice(proj_ids)
+            else:
+                proj = None
+            srv = make_server(rnd, idx, ip, proj, now, enc_pwds)
+            rows.append(tuple(srv.get(c) for c in COLUMNS))
+            if len(rows) >= batch:
+                cur.executemany(sql, rows)
+                added += cur.rowcount
+                rows = []
+        if rows:
+            cur.executemany(sql, rows)
+            added += cur.rowcount
+        # Rows went in directly, so derive the NIC/disk/RAM child tables here
+        database.rebuild_hardware_tables(cur)
+        conn.commit()
+    finally:
+        conn.close()
+
+    return {'servers': added, 'projects': len(proj_ids)}
+
+
+def main():
+    ap = argparse.ArgumentParser(description='Fill inventory DB with synthetic servers')
+    ap.add_argument('count', type=int, nargs='?', default=1000)
+    ap.add_argument('--projects', type=int, default=20)
+    ap.add_argument('--unassigned', type=float, default=0.1, help='share of servers without project')
+    ap.add_argument('--seed', type=int, default=42)
+    ap.add_argument('--start-ip', default='10.0.0.1')
+    ap.add_argument('--db', default=None, help='DB file (default: app inventory.db)')
+    args = ap.parse_args()
+
+    import database
+    if args.db:
+        database.DB_PATH = args.db
+        database.init_db()
+
+    res = generate_fleet(args.count, args.projects, args.unassigned, args.seed,
+                         args.start_ip, database.DB_PATH)
+    print(f"Added {res['servers']} servers in {res['projects']} projects -> {database.DB_PATH}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+# Hardware parsing - turns the scanner's display strings into rows for the child tables
+# disk_info / ram_physical / network_all stay as-is for exports, these just normalize them
+
+import re
+import json
+
+SIZE_PATTERN = re.compile(r'([\d.,]+)\s*([KMGTP])?i?B?', re.IGNORECASE)
+UNIT_TO_GB = {'K': 1 / 1024 ** 2, 'M': 1 / 1024, 'G': 1, 'T': 1024, 'P': 1024 ** 2}
+
+
+def size_to_gb(text):
+    # '480GB', '447.1G', '1.8T', '8192MB' -> float GB; no unit means GB. None if unparseable
+    m = SIZE_PATTERN.search(text or '')
+    if not m:
+        return None
+    try:
+        num = float(m.group(1).replace(',', '.'))
+    except ValueError:
+        return None
+    unit = (m.group(2) or 'G').upper()
+    return round(num * UNIT_TO_GB[unit], 2)
+
+
+def normalize_mac(mac):
+    # Any separator/case -> 'AA:BB:CC:DD:EE:FF'; anything that isn't 12 hex digits is kept as typed
+    hexes = re.sub(r'[^0-9a-fA-F]', '', mac or '')
+    if len(hexes) != 12:
+        return (mac or '').strip().upper()
+    return ':'.join(hexes[i:i + 2] for i in range(0, 12, 2)).upper()
+
+
+def parse_nics(network_all):
+    # JSON list of {IP, Subnet, Gateway, MAC} -> [(ip, subnet, gateway, mac)]
+    try:
+        nets = json.loads(network_all or '[]')
+    except (ValueError, TypeError):
+        return []
+    if isinstance(nets, dict):
+        nets = [nets]
+    out = []
+    for n in nets if isinstance(nets, list) else []:
+        if not isinstance(n, dict):
+            continue
+        out.append((n.get('IP') or '', str(n.get('Subnet') or ''), n.get('Gateway') or '',
+                    normalize_mac(n.get('MAC'))))
+    return out
+
+
+def parse_disks(disk_info):
+    # 'Disk 0: MODEL - 480GB; sda: MODEL - 447.1G' -> [(name, model, size_gb)]
+    out = []
+    if not disk_info or disk_info == 'N/A':
+        return out
+    for part in disk_info.split(';'):
+        part = part.strip()
+        if not part:
+            continue
+        name, _, rest = part.partition(':')
+        if not rest:
+            name, rest = '', part
+        model, sep, size = rest.rpartition('-')
+        if not sep:
+            model, size = rest, ''
+        out.append((name.strip(), model.strip(), size_to_gb(size)))
+    return out
+
+
+def parse_memory(ram_physical):
+    # '16GB + 16GB' -> [16.0, 16.0]
+    if not ram_physical or ram_physical == 'N/A':
+        return []
+    sizes = [size_to_gb(m) for m in ram_physical.split('+')]
+    return [s for s in sizes if s]
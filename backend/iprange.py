@@ -0,0 +1,104 @@
+# IP range handling - CIDR, start/end pairs, exclusions
+# Everything is done on integer intervals so a /12 never becomes a list of strings
+
+import ipaddress
+
+
+def parse_range(spec, end=None, hosts_only=True):
+    """
+    Parse one range spec into an inclusive (start_int, end_int) interval.
+    Accepts: '10.0.0.5', '10.0.0.0/24', '10.0.0.1-10.0.3.200', '10.0.0.10-20',
+    or spec + end as two separate IPs. Raises ValueError on bad input.
+    hosts_only drops network/broadcast of CIDR blocks (off for exclusions).
+    """
+    spec = (spec or '').strip()
+    end = (end or '').strip()
+    if not spec:
+        raise ValueError('Empty IP range')
+
+    if end:
+        lo, hi = spec, end
+    elif '/' in spec:
+        net = ipaddress.IPv4Network(spec, strict=False)
+        first, last = int(net.network_address), int(net.broadcast_address)
+        # Skip network/broadcast like ipaddress.hosts() does, except for /31 and /32
+        if hosts_only and net.prefixlen < 31:
+            first, last = first + 1, last - 1
+        return first, last
+    elif '-' in spec:
+        lo, hi = [p.strip() for p in spec.split('-', 1)]
+        # Short form: 10.0.0.10-20
+        if '.' not in hi:
+            hi = lo.rsplit('.', 1)[0] + '.' + hi
+    else:
+        lo = hi = spec
+
+    a = int(ipaddress.IPv4Address(lo))
+    b = int(ipaddress.IPv4Address(hi))
+    if b < a:
+        raise ValueError(f'Range end is before start: {lo} - {hi}')
+    return a, b
+
+
+def _merge(intervals):
+    out = []
+    for a, b in sorted(intervals):
+        if out and a <= out[-1][1] + 1:
+            if b > out[-1][1]:
+                out[-1] = (out[-1][0], b)
+        else:
+            out.append((a, b))
+    return out
+
+
+def build_intervals(ranges, exclude=None):
+    """
+    Turn range specs into sorted, merged, non-overlapping intervals with the
+    excluded parts cut out. `ranges` items are strings or (start, end) tuples.
+    """
+    inc = []
+    for r in ranges:
+        if isinstance(r, (tuple, list)):
+            inc.append(parse_range(r[0], r[1] if len(r) > 1 else None))
+        else:
+            inc.append(parse_range(r))
+    inc = _merge(inc)
+
+    exc = _merge(parse_range(e, hosts_only=False) for e in (exclude or []) if e and str(e).strip())
+    return subtract(inc, exc)
+
+
+def subtract(inc, exc):
+    # Cut sorted/merged `exc` intervals out of sorted/merged `inc` - one pass
+    if not exc:
+        return inc
+    out = []
+    j = 0
+    for a, b in inc:
+        while j < len(exc) and exc[j][1] < a:
+            j += 1
+        k = j
+        cur = a
+        while k < len(exc) and exc[k][0] <= b:
+            if exc[k][0] > cur:
+                out.append((cur, exc[k][0] - 1))
+            cur = max(cur, exc[k][1] + 1)
+            k += 1
+        if cur <= b:
+            out.append((cur, b))
+    return out
+
+
+def ip_to_int(ip):
+    return int(ipaddress.IPv4Address(ip))
+
+
+def count_ips(intervals):
+    return sum(b - a + 1 for a, b in intervals)
+
+
+def iter_ips(intervals):
+    # Lazy - yields dotted strings one at a time
+    for a, b in intervals:
+        for n in range(a, b + 1):
+            yield str(ipaddress.IPv4Address(n))
@@ -4,8 +4,10 @@ import paramiko
 import winrm
 import socket
 import json
+import logging
+import itertools
 import concurrent.futures
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import FIRST_COMPLETED, wait
 
 
 class WindowsScanner:
@@ -363,12 +365,95 @@ def check_port(ip_addr, port_num, timeout=3):
         return False
 
 
+# Minimal WS-Man request - enough to get HTTP.sys to answer with its Server/auth headers
+WINRM_PROBE = ('POST /wsman HTTP/1.1\r\nHost: {ip}:5985\r\n'
+               'Content-Type: application/soap+xml;charset=UTF-8\r\n'
+               'Content-Length: 0\r\nConnection: close\r\n\r\n')
+
+
+def probe_port(ip_addr, port_num, timeout=3):
+    # Connect once and grab whatever identifies the OS on the same socket:
+    # SSH banner on 22, HTTP status + headers on 5985. Returns (is_open, banner)
+    try:
+        s = socket.create_connection((ip_addr, port_num), timeout=timeout)
+    except OSError:
+        return False, None
+    
+    banner = b''
+    try:
+        if port_num == 22:
+            # Server talks first
+            banner = s.recv(256)
+        elif port_num == 5985:
+            s.sendall(WINRM_PROBE.format(ip=ip_addr).encode('ascii'))
+            while b'\r\n\r\n' not in banner and len(banner) < 4096:
+                chunk = s.recv(1024)
+                if not chunk:
+                    break
+                banner += chunk
+    except OSError:
+        pass
+    finally:
+        s.close()
+    
+    return True, banner.decode('latin-1').strip() if banner else None
+
+
+def classify_banner(port_num, banner):
+    # 'Windows' / 'Linux' from an SSH banner or WinRM HTTP headers, None if it doesn't tell
+    if not banner:
+        return None
+    b = banner.lower()
+    
+    if port_num == 22:
+        if not b.startswith('ssh-'):
+            return None
+        # e.g. SSH-2.0-OpenSSH_for_Windows_8.1 vs SSH-2.0-OpenSSH_8.9p1 Ubuntu-3ubuntu0.4
+        if 'windows' in b:
+            return 'Windows'
+        return 'Linux'
+    
+    if port_num == 5985:
+        if not b.startswith('http/'):
+            return None
+        headers = b.split('\r\n\r\n')[0]
+        # HTTP.sys answers WS-Man with Server: Microsoft-HTTPAPI/2.0 and Negotiate/Kerberos auth
+        if 'microsoft-httpapi' in headers or 'server: microsoft' in headers:
+            return 'Windows'
+        if 'www-authenticate: negotiate' in headers or 'www-authenticate: kerberos' in headers:
+            return 'Windows'
+        return None
+    
+    return None
+
+
+# Management ports per OS - what a real scan would connect to
+MGMT_PORTS = {'windows': (5985, 135, 445), 'linux': (22,)}
+
+
+def is_host_up(ip_addr, os_type=None, timeout=2):
+    # Cheap liveness check: any management port for the OS accepts a connection (no login)
+    ports = MGMT_PORTS.get((os_type or '').lower(), (22, 5985, 135))
+    return any(check_port(ip_addr, p, timeout) for p in ports)
+
+
 def detect_os_type(ip_addr, timeout=3):
-    # Try to figure out if it's Windows or Linux
-    if check_port(ip_addr, 5985, timeout) or check_port(ip_addr, 5986, timeout):
+    # Fingerprint from the first port that answers; only fall back to "which port is open"
+    # when the banner doesn't tell us anything
+    guess = None
+    for port in (5985, 22):
+        is_open, banner = probe_port(ip_addr, port, timeout)
+        if not is_open:
+            continue
+        os_t = classify_banner(port, banner)
+        if os_t:
+            return os_t
+        guess = guess or ('Windows' if port == 5985 else 'Linux')
+    
+    if guess:
+        return guess
+    if check_port(ip_addr, 5986, timeout):
         return 'Windows'
-    if check_port(ip_addr, 22, timeout):
-        return 'Linux'
     return 'Windows'  # default
 
 
@@ -409,22 +494,12 @@ def scan_server(srv):
         return {'id': srv['id'], 'status': 'Offline', 'error': str(e)}
 
 
-def scan_all_servers(servers_list, max_workers=10):
-    # Scan multiple servers in parallel
-    results = []
-    
-    with ThreadPoolExecutor(max_workers=max_workers) as exec:
-        futures = {exec.submit(scan_server, s): s for s in servers_list}
-        
-        for fut in as_completed(futures):
-            srv = futures[fut]
-            try:
-                res = fut.result()
-                results.append(res)
-            except Exception as e:
-                results.append({'id': srv['id'], 'ip': srv['ip'], 'status': 'Offline', 'error': str(e)})
-    
-    return results
+def iter_scan_servers(servers_list, max_workers=10):
+    # Scan servers in parallel, yielding each result as soon as that server is done
+    for srv, res in iter_probe(scan_server, servers_list, max_workers):
+        if isinstance(res, Exception):
+            res = {'id': srv['id'], 'ip': srv['ip'], 'status': 'Offline', 'error': str(res)}
+        yield res
 
 
 def discover_server(ip_addr, timeout=1):
@@ -456,9 +531,16 @@ def discover_server(ip_addr, timeout=1):
     open_ports = []
     has_critical_port = False
     
-    # Check critical ports first
+    # Check critical ports first - SSH/WinRM connections also grab the banner for fingerprinting
+    fingerprint = None
     for port, desc in critical_ports.items():
-        if check_port(ip_addr, port, timeout):
+        if port in (22, 5985):
+            is_open, banner = probe_port(ip_addr, port, timeout)
+            if is_open and not fingerprint:
+                fingerprint = classify_banner(port, banner)
+        else:
+            is_open = check_port(ip_addr, port, timeout)
+        if is_open:
             open_ports.append(f"{port}/{desc}")
             has_critical_port = True
     
@@ -475,34 +557,62 @@ def discover_server(ip_addr, timeout=1):
     if result['reachable']:
         result['open_ports'] = open_ports
         
-        # Detect OS based on open ports
-        if any('22' in p for p in open_ports):
-            result['os_type'] = 'Linux'
+        # Banner wins, port heuristics are the fallback
+        if fingerprint:
+            result['os_type'] = fingerprint
         elif any(p.startswith('3389') or p.startswith('5985') or p.startswith('135') for p in open_ports):
             result['os_type'] = 'Windows'
-        elif any('445' in p for p in open_ports):
+        elif any(p.startswith('22/') for p in open_ports):
+            result['os_type'] = 'Linux'
+        elif any(p.startswith('445') for p in open_ports):
             result['os_type'] = 'Windows'
     
     return result
 
 
-def discover_servers_in_range(ip_list, max_workers=50):
+def iter_probe(fn, items, max_workers=50):
     """
-    Scan list of IPs and find active/reachable servers
-    Returns: list of {'ip': str, 'reachable': bool, 'os_type': str, 'open_ports': list}
+    Shared probe engine - runs fn(item) over any iterable (e.g. iprange generator)
+    with a bounded number of calls in flight, so big inputs are never fully
+    materialized. Yields (item, result) as each one finishes; result is the
+    exception if fn raised.
     """
-    active_servers = []
+    it = iter(items)
     
     with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-        future_to_ip = {executor.submit(discover_server, ip): ip for ip in ip_list}
-        
-        for future in concurrent.futures.as_completed(future_to_ip):
-            try:
-                result = future.result()
-                if result['reachable']:
-                    active_servers.append(result)
-            except Exception as e:
-                logging.error(f"Discovery error for IP: {e}")
-    
-    return active_servers
+        pending = {}
+        for item in itertools.islice(it, max_workers * 4):
+            pending[executor.submit(fn, item)] = item
+        
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                item = pending.pop(future)
+                try:
+                    yield item, future.result()
+                except Exception as e:
+                    yield item, e
+            # Top up the queue
+            for item in itertools.islice(it, len(done)):
+                pending[executor.submit(fn, item)] = item
+
+
+def iter_discovery(ip_list, max_workers=50):
+    # Probe IPs and yield each discover_server result as soon as it's done
+    # A probe that blew up carries 'error' - we don't know the host is down, only that we failed
+    for ip, res in iter_probe(discover_server, ip_list, max_workers):
+        if isinstance(res, Exception):
+            logging.error(f"Discovery error for IP {ip}: {res}")
+            res = {'ip': ip, 'reachable': False, 'os_type': 'Unknown', 'open_ports': [], 'error': str(res)}
+        yield res
+
 
+def detect_os_types(ip_list, max_workers=50, timeout=3):
+    # detect_os_type for many IPs at once - total time is bounded by the slowest hosts
+    found = {}
+    for ip, res in iter_probe(lambda ip: detect_os_type(ip, timeout), ip_list, max_workers):
+        if isinstance(res, Exception):
+            logging.error(f"OS detection error for IP {ip}: {res}")
+            res = 'Windows'
+        found[ip] = res
+    return found
@@ -10,6 +10,13 @@ let projects = [];
 let currentProjectId = null; // null = all projects
 let sortColumn = 'hostname';
 let sortDirection = 'asc';
+// Server-side paging: cursor of each visited page, so Prev can go back
+let pageSize = 100;
+let pageCursors = [null];
+let pageIndex = 0;
+let nextCursor = null;
+let totalServers = 0;
+let searchTimer = null;
 let isLoading = false;
 let confirmCallback = null;
 
@@ -45,34 +52,38 @@ async function apiCall(endpoint, options = {}) {
 
 async function loadServers() {
     try {
-        let endpoint = '/api/servers';
+        const params = new URLSearchParams({
+            limit: pageSize,
+            sort: sortColumn,
+            dir: sortDirection
+        });
+        if (currentProjectId !== null) params.set('project_id', currentProjectId);
         
-        if (currentProjectId !== null) {
-            if (currentProjectId === 'unassigned') {
-                endpoint = '/api/projects/unassigned/servers';
-            } else {
-                endpoint = `/api/projects/${currentProjectId}/servers`;
-            }
-        }
+        const searchInput = document.getElementById('searchInput');
+        const filterOS = document.getElementById('filterOS');
+        const filterStatus = document.getElementById('filterStatus');
+        if (searchInput && searchInput.value.trim()) params.set('q', searchInput.value.trim());
+        if (filterOS && filterOS.value) params.set('os', filterOS.value);
+        if (filterStatus && filterStatus.value) params.set('status', filterStatus.value);
+        if (pageCursors[pageIndex]) params.set('cursor', pageCursors[pageIndex]);
         
-        const data = await apiCall(endpoint);
+        const data = await apiCall(`/api/servers?${params}`);
         if (data.success) {
             servers = data.servers || [];
+            totalServers = data.total || 0;
+            nextCursor = data.next_cursor || null;
             
-            // Add project names to servers
-            servers.forEach(server => {
-                if (server.project_id) {
-                    const project = projects.find(p => p.id === server.project_id);
-                    server.project_name = project ? project.name : 'Unknown';
-                } else {
-                    server.project_name = '';
-                }
-            });
+            // Page emptied under us (deletes) - step back
+            if (servers.length === 0 && pageIndex > 0) {
+                pageIndex--;
+                return loadServers();
+            }
             
-            filteredServers = [...servers];
+            filteredServers = servers;
             renderTable();
             updateEmptyState();
             updateProjectStats();
+            updatePagination();
         } else {
             console.error('Failed to load servers:', data.error);
         }
@@ -81,6 +92,39 @@ async function loadServers() {
     }
 }
 
+function resetPaging() {
+    pageCursors = [null];
+    pageIndex = 0;
+    nextCursor = null;
+}
+
+function nextPage() {
+    if (!nextCursor) return;
+    pageCursors = pageCursors.slice(0, pageIndex + 1);
+    pageCursors.push(nextCursor);
+    pageIndex++;
+    loadServers();
+}
+
+function prevPage() {
+    if (pageIndex === 0) return;
+    pageIndex--;
+    loadServers();
+}
+
+function updatePagination() {
+    const info = document.getElementById('pageInfo');
+    const prevBtn = document.getElementById('prevPageBtn');
+    const nextBtn = document.getElementById('nextPageBtn');
+    if (!info) return;
+    
+    const from = totalServers ? pageIndex * pageSize + 1 : 0;
+    const to = pageIndex * pageSize + servers.length;
+    info.textContent = `${from}-${to} of ${totalServers}`;
+    if (prevBtn) prevBtn.disabled = pageIndex === 0;
+    if (nextBtn) nextBtn.disabled = !nextCursor;
+}
+
 async function loadStats() {
     try {
         const data = await apiCall('/api/stats');
@@ -177,6 +221,7 @@ function onProjectChange() {
         currentProjectId = isNaN(parsed) ? null : parsed;
     }
     
+    resetPaging();
     loadServers();
     loadStats();
     updateProjectStats();
@@ -189,13 +234,13 @@ function updateProjectStats() {
     if (!projectStats) return;
     
     if (currentProjectId === null) {
-        projectStats.textContent = `Total: ${servers.length} server${servers.length !== 1 ? 's' : ''}`;
+        projectStats.textContent = `Total: ${totalServers} server${totalServers !== 1 ? 's' : ''}`;
     } else if (currentProjectId === 'unassigned') {
-        projectStats.textContent = `Unassigned: ${servers.length} server${servers.length !== 1 ? 's' : ''}`;
+        projectStats.textContent = `Unassigned: ${totalServers} server${totalServers !== 1 ? 's' : ''}`;
     } else {
         const project = projects.find(p => p.id === currentProjectId);
         if (project) {
-            projectStats.textContent = `${project.name}: ${servers.length} server${servers.length !== 1 ? 's' : ''}`;
+            projectStats.textContent = `${project.name}: ${totalServers} server${totalServers !== 1 ? 's' : ''}`;
         }
     }
 }
@@ -369,6 +414,7 @@ function deleteProjectConfirm(projectId, projectName) {
                     if (currentProjectId === projectId) {
                         currentProjectId = null;
                         document.getElementById('projectSelect').value = '';
+                        resetPaging();
                     }
                     
                     await loadProjects();
@@ -649,7 +695,7 @@ function deleteServer(id) {
 }
 
 function clearAllServers() {
-    if (servers.length === 0) {
+    if (totalServers === 0) {
         showToast('No servers to delete', 'warning');
         return;
     }
@@ -659,17 +705,17 @@ function clearAllServers() {
     
     if (currentProjectId === null) {
         title = '⚠️ Delete All Servers';
-        message = `Are you sure you want to delete ALL servers (${servers.length} server${servers.length !== 1 ? 's' : ''})?\n\nThis action cannot be undone!`;
+        message = `Are you sure you want to delete ALL servers (${totalServers} server${totalServers !== 1 ? 's' : ''})?\n\nThis action cannot be undone!`;
         endpoint = '/api/servers/clear';
     } else if (currentProjectId === 'unassigned') {
         title = '⚠️ Delete Unassigned Servers';
-        message = `Are you sure you want to delete unassigned servers (${servers.length} server${servers.length !== 1 ? 's' : ''})?\n\nThis action cannot be undone!`;
+        message = `Are you sure you want to delete unassigned servers (${totalServers} server${totalServers !== 1 ? 's' : ''})?\n\nThis action cannot be undone!`;
         endpoint = '/api/servers/clear?project_id=unassigned';
     } else {
         const project = projects.find(p => p.id === currentProjectId);
         const projectName = project ? project.name : 'Selected project';
         title = `⚠️ Delete "${projectName}" Servers`;
-        message = `Are you sure you want to delete servers in project "${projectName}" (${servers.length} server${servers.length !== 1 ? 's' : ''})?\n\nThis action cannot be undone!`;
+        message = `Are you sure you want to delete servers in project "${projectName}" (${totalServers} server${totalServers !== 1 ? 's' : ''})?\n\nThis action cannot be undone!`;
         endpoint = `/api/servers/clear?project_id=${currentProjectId}`;
     }
     
@@ -809,7 +855,7 @@ async function scanServer(id) {
 }
 
 async function scanAllServers() {
-    if (servers.length === 0) {
+    if (totalServers === 0) {
         showToast('No servers to scan', 'warning');
         return;
     }
@@ -827,7 +873,7 @@ async function scanAllServers() {
         }
     }
     
-    showLoading(`Scanning ${servers.length} server${servers.length > 1 ? 's' : ''}...`);
+    showLoading(`Scanning ${totalServers} server${totalServers > 1 ? 's' : ''}...`);
     
     try {
         const data = await apiCall(endpoint, {
@@ -877,7 +923,7 @@ function showExportModal() {
 async function exportCurrentProject() {
     closeModal('exportModal');
     
-    if (servers.length === 0) {
+    if (totalServers === 0) {
         showToast('No servers to export', 'warning');
         return;
     }
@@ -1045,26 +1091,12 @@ function renderCPUInfo(server) {
 // ==================== FILTERING & SORTING ====================
 
 function filterServers() {
-    const searchInput = document.getElementById('searchInput');
-    const filterOS = document.getElementById('filterOS');
-    const filterStatus = document.getElementById('filterStatus');
-    
-    const searchTerm = searchInput ? searchInput.value.toLowerCase() : '';
-    const osFilter = filterOS ? filterOS.value : '';
-    const statusFilter = filterStatus ? filterStatus.value : '';
-    
-    filteredServers = servers.filter(server => {
-        const matchesSearch = !searchTerm || 
-            (server.hostname && server.hostname.toLowerCase().includes(searchTerm)) ||
-            (server.ip && server.ip.toLowerCase().includes(searchTerm));
-        const matchesOS = !osFilter || server.os_type === osFilter;
-        const matchesStatus = !statusFilter || server.status === statusFilter;
-        
-        return matchesSearch && matchesOS && matchesStatus;
-    });
-    
-    renderTable();
-    updateEmptyState();
+    // Filtering happens server-side; debounce typing so each keystroke isn't a request
+    clearTimeout(searchTimer);
+    searchTimer = setTimeout(() => {
+        resetPaging();
+        loadServers();
+    }, 250);
 }
 
 function sortTable(column) {
@@ -1075,21 +1107,8 @@ function sortTable(column) {
         sortDirection = 'asc';
     }
     
-    filteredServers.sort((a, b) => {
-        let valA = a[column] || '';
-        let valB = b[column] || '';
-        
-        if (typeof valA === 'string') {
-            valA = valA.toLowerCase();
-            valB = valB.toLowerCase();
-        }
-        
-        if (valA < valB) return sortDirection === 'asc' ? -1 : 1;
-        if (valA > valB) return sortDirection === 'asc' ? 1 : -1;
-        return 0;
-    });
-    
-    renderTable();
+    resetPaging();
+    loadServers();
 }
 
 // ==================== SERVER DETAILS ====================
@@ -1330,9 +1349,9 @@ function addIPRangeRow() {
         <div class="form-group" style="display: flex; gap: 10px; align-items: center; margin-bottom: 15px;">
             <label style="min-width: 60px;">Range ${ipRangeCounter}:</label>
             <div style="display: flex; gap: 10px; align-items: center; flex: 1;">
-                <input type="text" placeholder="192.168.1.1" class="ip-range-start" style="flex: 1;" required>
+                <input type="text" placeholder="192.168.1.1 or 10.0.0.0/16" class="ip-range-start" style="flex: 1;" required>
                 <span>to</span>
-                <input type="text" placeholder="192.168.1.255" class="ip-range-end" style="flex: 1;" required>
+                <input type="text" placeholder="192.168.1.255" class="ip-range-end" style="flex: 1;">
                 <button type="button" class="btn btn-sm btn-danger" onclick="removeIPRangeRow(${ipRangeCounter})" title="Remove">
                     ×
                 </button>
@@ -1368,6 +1387,16 @@ async function addIPRanges(event) {
             const start = startInput.value.trim();
             const end = endInput.value.trim();
             
+            // CIDR goes in the start field on its own
+            if (start.includes('/') && !end) {
+                if (!isValidCIDR(start)) {
+                    showToast('Invalid CIDR format', 'error');
+                    return;
+                }
+                ranges.push({ cidr: start });
+                continue;
+            }
+            
             if (!start || !end) {
                 showToast('Please fill all IP range fields', 'warning');
                 return;
@@ -1409,17 +1438,34 @@ async function addIPRanges(event) {
         const payload = { 
             ip_ranges: ranges,
             auto_detect: document.getElementById('ipRangeAutoDetect').checked,
-            discovery_mode: discoveryMode
+            discovery_mode: discoveryMode,
+            force_full: document.getElementById('ipRangeFullSweep').checked
         };
         
+        const excludeInput = document.getElementById('ipRangeExclude');
+        if (excludeInput && excludeInput.value.trim()) {
+            payload.exclude = excludeInput.value.trim();
+        }
+        
         if (projectIdToAssign) {
             payload.project_id = projectIdToAssign;
         }
         
-        const data = await apiCall('/api/servers/ip-ranges', {
-            method: 'POST',
-            body: JSON.stringify(payload)
-        });
+        // Discovery inserts hits as it goes - show progress and refresh the list meanwhile
+        let progressTimer = null;
+        if (discoveryMode) {
+            progressTimer = setInterval(pollDiscoveryProgress, 1500);
+        }
+        
+        let data;
+        try {
+            data = await apiCall('/api/servers/ip-ranges', {
+                method: 'POST',
+                body: JSON.stringify(payload)
+            });
+        } finally {
+            if (progressTimer) clearInterval(progressTimer);
+        }
         
         hideLoading();
         
@@ -1429,8 +1475,9 @@ async function addIPRanges(event) {
             if (discoveryMode) {
                 // Discovery mode results
                 if (result.scanned && result.found !== undefined) {
+                    const cachedNote = result.skipped_dead ? ` (${result.skipped_dead} recently dead IPs skipped)` : '';
                     showToast(
-                        `🎯 Discovery Complete! Scanned ${result.scanned} IPs, found ${result.found} active servers. ` +
+                        `🎯 Discovery Complete! Scanned ${result.scanned} IPs${cachedNote}, found ${result.found} active servers. ` +
                         `Added ${result.added}, skipped ${result.skipped} duplicates.`, 
                         'success'
                     );
@@ -1456,6 +1503,28 @@ async function addIPRanges(event) {
     }
 }
 
+let lastDiscoveryAdded = 0;
+
+async function pollDiscoveryProgress() {
+    try {
+        const data = await apiCall('/api/servers/ip-ranges/progress');
+        if (!data.success || !data.progress.running) return;
+        
+        const p = data.progress;
+        const loadingText = document.getElementById('loadingText');
+        if (loadingText) {
+            loadingText.textContent = `🔍 Discovery: probed ${p.probed} / ${p.total} IPs, found ${p.found}`;
+        }
+        
+        if (p.added !== lastDiscoveryAdded) {
+            lastDiscoveryAdded = p.added;
+            await loadServers();
+        }
+    } catch (error) {
+        // Progress is best effort
+    }
+}
+
 function isValidIP(ip) {
     const parts = ip.split('.');
     if (parts.length !== 4) return false;
@@ -1466,6 +1535,12 @@ function isValidIP(ip) {
     return true;
 }
 
+function isValidCIDR(cidr) {
+    const [ip, bits] = cidr.split('/');
+    const n = parseInt(bits, 10);
+    return isValidIP(ip) && !isNaN(n) && n >= 0 && n <= 32;
+}
+
 function showImportModal() {
     // Show info about which project servers will be added to
     const importInfo = document.querySelector('#importModal .import-info');